@@ -0,0 +1,353 @@
+# bench.py
+# Offline load test and microbenchmarks for /plan and /ask.
+#
+# The app runs in-process against stub_llm.py, so nothing leaves the machine
+# (the MiniLM embedding model must already be in the local Hugging Face cache).
+#
+#   python bench.py --requests 200 --concurrency 16 --token-delay 0.002
+#   python bench.py --save bench_baseline.json
+#   python bench.py --compare bench_baseline.json --tolerance 0.15
+#   python bench.py --micro-only   (includes the itinerary parser fuzz run)
+import argparse
+import asyncio
+import csv
+import functools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from itinerary_parser import ItineraryParser, parse_itinerary
+from metrics import LLM_TOKENS
+from stub_llm import StubConfig, start_stub
+
+INTERESTS = ["heritage", "food", "nature", "adventure", "spiritual", "shopping", "scenic", "wildlife", "cultural", "artistic"]
+QUESTIONS = [
+    "What are famous temples in {city}?",
+    "Which places in {city} are best in the evening?",
+    "Is {name} open on Mondays?",
+    "How much time do I need for {name}?",
+    "Suggest a budget-friendly day in {city}.",
+    "{city} में घूमने की सबसे अच्छी जगह कौन सी है?",
+]
+
+stage_times: Dict[str, List[float]] = defaultdict(list)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean_ms": round(1000 * statistics.fmean(values), 2) if values else 0.0,
+        "p50_ms": round(1000 * percentile(values, 50), 2),
+        "p95_ms": round(1000 * percentile(values, 95), 2),
+        "p99_ms": round(1000 * percentile(values, 99), 2),
+    }
+
+
+def timed(stage: str, fn):
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                stage_times[stage].append(time.perf_counter() - started)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stage_times[stage].append(time.perf_counter() - started)
+    return wrapper
+
+
+def build_corpus(csv_path: str, n: int, ask_ratio: float, seed: int) -> List[tuple]:
+    """Realistic /plan and /ask payloads drawn from the places table."""
+    rng = random.Random(seed)
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    corpus = []
+    for _ in range(n):
+        row = rng.choice(rows)
+        preferences = rng.sample(INTERESTS, rng.randint(1, 3))
+        if rng.random() < ask_ratio:
+            question = rng.choice(QUESTIONS).format(city=row["City"], name=row["Name"])
+            corpus.append(("/ask", {"question": question, "preferences": preferences}))
+        else:
+            corpus.append(("/plan", {
+                "preferences": preferences,
+                "duration": rng.randint(1, 5),
+                "budget": rng.choice([5000, 10000, 15000, 25000, 50000]),
+                "start_city": row["City"],
+            }))
+    return corpus
+
+
+def synthetic_output(days: int, noise: bool, rng: random.Random) -> str:
+    lines = ["Here is your itinerary:"]
+    for d in range(1, days + 1):
+        if noise and rng.random() < 0.3:
+            lines.append(f"Day {d}: Jaipur - Amber Fort, Hawa Mahal, City Palace, " + "and more " * 40)
+            continue
+        lines.append(
+            f"Day {d}: Jaipur - Amber Fort, Hawa Mahal. Stay: Eco Homestay - ₹2,800. "
+            f"Food: Dal Baati - ₹600. Cost: ₹{5000 + d:,}"
+        )
+    return "\n".join(lines)
+
+
+CURRENCIES = ["₹{:,}", "₹ {}", "Rs. {:,}", "Rs {}", "INR {:,}", "{:,}/-", "₹{}.00"]
+
+
+def fuzz_output(days: int, rng: random.Random) -> str:
+    """An itinerary with the format drift phi3 produces at high temperature: currency
+    and comma variants, markdown, wrapped or merged lines, missing fields, junk, truncation."""
+    money = lambda amount: rng.choice(CURRENCIES).format(amount)
+    lines = [rng.choice(["", "Here is your itinerary:", "**Itinerary**", "Sure! Day-wise plan below."])]
+    for d in range(1, days + 1):
+        stay, food = rng.choice([800, 1200, 2800, 15000]), rng.choice([300, 600, 1250])
+        parts = [
+            f"{rng.choice(['', '**', '- ', '### '])}Day {d}{rng.choice([':', ' -', '.', ':**'])} "
+            f"{rng.choice(['Jaipur', 'Delhi', 'Munnar', 'Old Goa'])} - Amber Fort, Hawa Mahal.",
+            f"Stay: {rng.choice(['Eco Homestay', 'Hotel 7 Hills', 'Zostel'])} - {money(stay)}.",
+            f"Food: {rng.choice(['Dal Baati', 'Thali (veg)', 'Street food'])} - {money(food)}.",
+            f"Cost: {money(stay + food + rng.choice([0, 50, 500]))}",
+        ]
+        drift = rng.random()
+        if drift < 0.1:
+            parts.pop(rng.randrange(1, 4))
+        elif drift < 0.2:
+            parts.insert(rng.randrange(1, 4), "(" + "x" * rng.randint(1, 400) + ")")
+        sep = rng.choice([" ", " ", " ", "\n", "\n  "])
+        lines.append(sep.join(parts) + rng.choice(["", "", " Day {}: ".format(d + 1)]))
+        if rng.random() < 0.05:
+            lines.append("Day " * rng.randint(1, 50) + "-" * rng.randint(0, 200) + "₹" * rng.randint(0, 50))
+    text = "\n".join(lines)
+    return text[:rng.randint(len(text) // 2, len(text))] if rng.random() < 0.1 else text
+
+
+def parse_streamed(text: str, chunk: int) -> ItineraryParser:
+    parser = ItineraryParser()
+    for i in range(0, len(text), chunk):
+        parser.feed(text[i:i + chunk])
+    parser.close()
+    return parser
+
+
+def fuzz_parser(cases: int, seed: int) -> dict:
+    """Random drifted outputs: the parser must never raise, must give the same days whether
+    it gets the text whole or in 3-char chunks, and should recover most days."""
+    rng = random.Random(seed)
+    crashes = mismatches = expected = recovered = chars = 0
+    started = time.perf_counter()
+    for _ in range(cases):
+        days = rng.randint(1, 40)
+        text = fuzz_output(days, rng)
+        chars += len(text)
+        expected += days
+        try:
+            whole = parse_streamed(text, len(text) or 1)
+            streamed = parse_streamed(text, 3)
+        except Exception:
+            crashes += 1
+            continue
+        recovered += len(whole.days)
+        if whole.days != streamed.days:
+            mismatches += 1
+    elapsed = time.perf_counter() - started
+    return {
+        "cases": cases,
+        "crashes": crashes,
+        "stream_mismatches": mismatches,
+        "day_recall": round(recovered / expected, 3) if expected else 0.0,
+        "us_per_call": round(1e6 * elapsed / cases / 2, 1),
+        "mb_per_sec": round(2 * chars / elapsed / 1e6, 2),
+    }
+
+
+def microbenchmarks(main, loops: int) -> dict:
+    rng = random.Random(7)
+    results = {}
+    for days, noise in ((3, False), (30, False), (30, True), (300, True), (3000, True)):
+        text = synthetic_output(days, noise, rng)
+        runs = max(1, loops * 30 // days) if days > 30 else loops
+        started = time.perf_counter()
+        for _ in range(runs):
+            parse_itinerary(text)
+        elapsed = time.perf_counter() - started
+        results[f"parse_{days}d{'_noisy' if noise else ''}"] = {
+            "chars": len(text),
+            "us_per_call": round(1e6 * elapsed / runs, 1),
+            "mb_per_sec": round(len(text) * runs / elapsed / 1e6, 2),
+        }
+
+    # Streaming: token-sized chunks as they come off llm.stream()
+    text = synthetic_output(300, True, rng)
+    runs = max(1, loops // 10)
+    started = time.perf_counter()
+    for _ in range(runs):
+        parse_streamed(text, 4)
+    elapsed = time.perf_counter() - started
+    results["parse_300d_streamed"] = {
+        "chars": len(text),
+        "us_per_call": round(1e6 * elapsed / runs, 1),
+        "mb_per_sec": round(len(text) * runs / elapsed / 1e6, 2),
+    }
+    # One pathological line: a long run of near-matches with no newline
+    text = "Day 1: " + "Stay - Food - Cost - ₹" * 20000
+    started = time.perf_counter()
+    parse_streamed(text, 4)
+    results["parse_pathological_line"] = {"chars": len(text), "us_per_call": round(1e6 * (time.perf_counter() - started), 1)}
+    results["parse_fuzz"] = fuzz_parser(max(50, loops), 11)
+
+    if main.retriever is not None:
+        queries = [("heritage, food near Delhi", "Delhi"), ("nature near Munnar", "Munnar"), ("temples in Varanasi", "Varanasi")]
+        started = time.perf_counter()
+        for i in range(loops):
+            query, city = queries[i % len(queries)]
+            main.retriever.search(query, 12, **main.places.locate(city))
+        elapsed = time.perf_counter() - started
+        results["retrieval_search"] = {"us_per_call": round(1e6 * elapsed / loops, 1)}
+    return results
+
+
+async def run_load(main, corpus: List[tuple], concurrency: int) -> dict:
+    import httpx
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    limit = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench",
+                                 timeout=600) as client:
+        async def one(path: str, payload: dict):
+            async with limit:
+                started = time.perf_counter()
+                try:
+                    r = await client.post(path, json=payload)
+                    body = r.json()
+                    if r.status_code != 200 or body.get("error"):
+                        errors[path] += 1
+                except Exception:
+                    errors[path] += 1
+                latencies[path].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(path, payload) for path, payload in corpus))
+        wall = time.perf_counter() - started
+
+    return {
+        "requests": len(corpus),
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(corpus) / wall, 2),
+        "endpoints": {path: {**summarize(values), "errors": errors[path]} for path, values in latencies.items()},
+    }
+
+
+async def bench(args) -> dict:
+    import main
+
+    async with main.lifespan(main.app):
+        await asyncio.wait_for(main.rag_ready.wait(), 300)
+        # Stage timers
+        main.retriever.search = timed("retrieval", main.retriever.search)
+        main.build_plan_prompt = timed("prompt_build", main.build_plan_prompt)
+        main.build_ask_prompt = timed("prompt_build_ask", main.build_ask_prompt)
+        main.llm.generate = timed("generation", main.llm.generate)
+        # Parsing a finished answer; streamed answers are parsed as they arrive, inside generation.
+        main.build_option = timed("parsing", main.build_option)
+
+        micro = microbenchmarks(main, args.micro_loops)
+        stage_times.clear()
+        if args.micro_only:
+            return {"micro": micro}
+
+        corpus = build_corpus("data/places.csv", args.requests, args.ask_ratio, args.seed)
+        tokens_before = dict(LLM_TOKENS.values)
+        load = await run_load(main, corpus, args.concurrency)
+        load["stages"] = {stage: summarize(values) for stage, values in sorted(stage_times.items())}
+        load["llm_tokens"] = {
+            "/".join(key): int(value - tokens_before.get(key, 0)) for key, value in sorted(LLM_TOKENS.values.items())
+        }
+        return {"load": load, "micro": micro}
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions beyond `tolerance` (fraction) in throughput, endpoint p95, or microbenchmark time."""
+    problems = []
+    if "load" in current and "load" in baseline:
+        cur, base = current["load"], baseline["load"]
+        if cur["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            problems.append(f"throughput {cur['throughput_rps']} rps < baseline {base['throughput_rps']} rps")
+        for path, stats in cur["endpoints"].items():
+            base_stats = base["endpoints"].get(path)
+            if base_stats and stats["p95_ms"] > base_stats["p95_ms"] * (1 + tolerance):
+                problems.append(f"{path} p95 {stats['p95_ms']} ms > baseline {base_stats['p95_ms']} ms")
+    for name, stats in current.get("micro", {}).items():
+        if stats.get("crashes") or stats.get("stream_mismatches"):
+            problems.append(f"{name}: {stats.get('crashes', 0)} crashes, {stats.get('stream_mismatches', 0)} stream mismatches")
+        base_stats = baseline.get("micro", {}).get(name)
+        if base_stats and stats["us_per_call"] > base_stats["us_per_call"] * (1 + tolerance):
+            problems.append(f"{name} {stats['us_per_call']} us > baseline {base_stats['us_per_call']} us")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Touristique offline benchmark")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ask-ratio", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--token-delay", type=float, default=0.002, help="stub seconds per generated token")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="stub fixed latency before the first token")
+    parser.add_argument("--prompt-token-delay", type=float, default=0.0005, help="stub prefill seconds per uncached prompt word")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of stub calls that return HTTP 500")
+    parser.add_argument("--cache", action="store_true", help="keep the generation cache on (off by default)")
+    parser.add_argument("--micro-loops", type=int, default=200)
+    parser.add_argument("--micro-only", action="store_true")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    server, url = start_stub(0, StubConfig(args.token_delay, args.first_token_delay, args.fail_rate,
+                                           prompt_token_delay=args.prompt_token_delay))
+    os.environ["OLLAMA_URL"] = f"{url}/api/generate"
+    os.environ["XAI_API_URL"] = f"{url}/v1/chat/completions"
+    os.environ.setdefault("XAI_API_KEY", "stub")
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    if not args.cache:
+        os.environ["GEN_CACHE_SIZE"] = "0"
+
+    results = asyncio.run(bench(args))
+    results["stub"] = {**server.config.requests, "token_delay": args.token_delay,
+                       "first_token_delay": args.first_token_delay, "prompt_token_delay": args.prompt_token_delay,
+                       "fail_rate": args.fail_rate}
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        sys.exit(1 if problems else 0)
@@ -0,0 +1,106 @@
+# context_compactor.py
+from typing import List, Optional, Sequence, Tuple
+
+from places import Place
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for budgeting: about 4 characters per token, never fewer than the words."""
+    return max(len(text) // 4, len(text.split()))
+
+
+class TokenBudget:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+
+    def take(self, text: str, force: bool = False) -> bool:
+        """Charge `text` to the budget if it fits (or if `force`); report whether it was taken."""
+        cost = estimate_tokens(text)
+        if not force and self.used + cost > self.limit:
+            return False
+        self.used += cost
+        return True
+
+
+def dedupe_places(places: Sequence[Place]) -> List[Place]:
+    """Drop repeated rows and repeated names, keeping rank order."""
+    seen, unique = set(), []
+    for p in places:
+        key = " ".join(p.name.lower().split())
+        if p.row_id in seen or key in seen:
+            continue
+        seen.update((p.row_id, key))
+        unique.append(p)
+    return unique
+
+
+def compact_plan_places(places: Sequence[Place], limit: int) -> List[str]:
+    """Context lines for the planner prompt, best-ranked first, within `limit` tokens (at least one)."""
+    budget = TokenBudget(limit)
+    return [line for line in (p.context_line() for p in dedupe_places(places))
+            if budget.take(line, force=not budget.used)]
+
+
+def render_day(day_info: dict, detailed: bool) -> str:
+    dests = ", ".join(day_info.get("destinations", []))
+    line = f"Day {day_info.get('day')} ({day_info.get('city')}): {dests}"
+    if detailed:
+        line += f" | Stay: {day_info.get('stay', '-')} | Food: {day_info.get('food', '-')} | Cost: ₹{day_info.get('cost', 0):,}"
+    return line
+
+
+def option_header(option: dict) -> str:
+    return f"Option {option.get('option_number', '?')} (Total: ₹{option.get('total_cost', 0):,})"
+
+
+def render_option(option: dict, detailed: bool) -> str:
+    """Full day-by-day text, or a one-line brief with only cities and places."""
+    header = option_header(option)
+    days = option.get("itinerary", [])
+    if detailed:
+        return header + ":\n" + "\n".join(f"  {render_day(d, True)}" for d in days)
+    return header + ": " + "; ".join(render_day(d, False) for d in days)
+
+
+def compact_facts(docs: Sequence[Place], limit: int) -> str:
+    """Place details for the chat prompt, best match first, within `limit` tokens (at least one)."""
+    budget = TokenBudget(limit)
+    details = [p.details() for p in dedupe_places(docs)]
+    return "\n---\n".join(d for d in details if budget.take(d, force=not budget.used))
+
+
+def compact_itineraries(selected: Optional[dict], options: Optional[Sequence[dict]], limit: int) -> Tuple[str, str]:
+    """Fit the user's itineraries into `limit` tokens; returns (selected, other options).
+
+    The selected option comes first, day by day, with any overflow days
+    summarised in a count. The other options follow in full while they
+    fit, then as one-line briefs. The option that was selected is not
+    repeated among the others.
+    """
+    budget = TokenBudget(limit)
+
+    selected_text = ""
+    if selected:
+        lines = [render_day(d, True) for d in selected.get("itinerary", [])]
+        kept = []
+        for line in lines:
+            if not budget.take(line, force=not kept):
+                break
+            kept.append(line)
+        if len(kept) < len(lines):
+            kept.append(f"... {len(lines) - len(kept)} more days")
+        selected_text = option_header(selected) + ":\n" + "\n".join(f"  {line}" for line in kept)
+
+    others = [o for o in (options or [])[:5]
+              if not selected or o.get("option_number") != selected.get("option_number")]
+    rendered = []
+    for option in others:
+        full = render_option(option, True)
+        if budget.take(full):
+            rendered.append(full)
+            continue
+        brief = render_option(option, False)
+        if budget.take(brief):
+            rendered.append(brief)
+    return selected_text, "\n".join(rendered)
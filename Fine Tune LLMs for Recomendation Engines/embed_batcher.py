@@ -0,0 +1,126 @@
+# embed_batcher.py
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+
+
+class EmbeddingBatcher:
+    """Micro-batching front for an embeddings model.
+
+    embed_query() calls from many request threads are queued. A single
+    worker thread drains the queue for up to `max_wait` seconds or
+    `max_batch` texts, runs one embed_documents() pass, and hands each
+    caller its vector. Recently embedded strings come from an LRU and
+    never reach the queue. It exposes the same embed_query/embed_documents
+    methods as the wrapped model, so it can be passed to Chroma as its
+    embedding function.
+    """
+
+    def __init__(self, model, max_batch: int = 32, max_wait: float = 0.005, cache_size: int = 2048):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue: "queue.Queue[Tuple[str, Future, float]]" = queue.Queue()
+        self._closed = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.batches = 0
+        self.batched_items = 0
+        self.queued_requests = 0
+        self.max_batch_seen = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self.queue_delay_total = 0.0
+        self.queue_delay_max = 0.0
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    # Embeddings interface
+    def embed_query(self, text: str) -> List[float]:
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.cache_hits += 1
+                return vector
+            self.cache_misses += 1
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future.result()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    # Worker
+    def _run(self):
+        while not self._closed:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._closed = True
+                    break
+                batch.append(item)
+            self._process(batch)
+
+    def _process(self, batch: List[Tuple[str, Future, float]]):
+        now = time.perf_counter()
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            vectors = dict(zip(texts, self.model.embed_documents(texts)))
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        with self._cache_lock:
+            for text, vector in vectors.items():
+                self._cache[text] = vector
+                self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self.batches += 1
+            self.batched_items += len(texts)
+            self.max_batch_seen = max(self.max_batch_seen, len(texts))
+            self.batch_sizes[len(texts)] = self.batch_sizes.get(len(texts), 0) + 1
+            self.queued_requests += len(batch)
+            for _, _, queued_at in batch:
+                delay = now - queued_at
+                self.queue_delay_total += delay
+                self.queue_delay_max = max(self.queue_delay_max, delay)
+
+        for text, future, _ in batch:
+            future.set_result(vectors[text])
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+
+    def stats(self) -> dict:
+        with self._cache_lock:
+            return {
+                "batches": self.batches,
+                "avg_batch_size": round(self.batched_items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "batch_size_counts": dict(sorted(self.batch_sizes.items())),
+                "avg_queue_delay_ms": round(1000 * self.queue_delay_total / self.queued_requests, 3) if self.queued_requests else 0.0,
+                "max_queue_delay_ms": round(1000 * self.queue_delay_max, 3),
+                "cache_size": len(self._cache),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+            }
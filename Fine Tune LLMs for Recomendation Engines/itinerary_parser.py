@@ -0,0 +1,260 @@
+# itinerary_parser.py
+import re
+from typing import List, Optional, Tuple
+
+# Every pattern here is anchored or has a single unambiguous repetition, so
+# each line is scanned a bounded number of times; no lazy groups, no DOTALL.
+DAY_START = re.compile(r"[\s*#>\-•]*day\s*(\d{1,3})\s*[:.)\-–—]\s*", re.IGNORECASE)
+DAY_INLINE = re.compile(r"\bday\s*(\d{1,3})\s*:", re.IGNORECASE)
+AMOUNT = re.compile(r"(₹|\brs\.?|\binr)?\s*(\d[\d,]*(?:\.\d+)?)", re.IGNORECASE)
+FIELDS = ("stay", "food", "cost")
+MAX_RECORD_LINES = 6
+
+
+def parse_amount(text: str) -> Optional[int]:
+    """The amount in `text` as int rupees (₹1,200 / Rs. 1200 / INR 1,00,000 / 1200.50).
+
+    A calculation (`2 nights x ₹2,700 = ₹5,400`) gives its result after the last
+    `=`; otherwise the first currency-tagged amount wins over bare numbers
+    (`for 2 people ₹3,000`), and failing that the first number.
+    """
+    if "=" in text:
+        result = parse_amount(text.rsplit("=", 1)[1])
+        if result is not None:
+            return result
+    first = None
+    for m in AMOUNT.finditer(text):
+        digits = m.group(2).replace(",", "")
+        if not digits:
+            continue
+        if m.group(1):
+            return int(float(digits))
+        if first is None:
+            first = int(float(digits))
+    return first
+
+
+def _find_field(lowered: str, name: str, start: int = 0) -> int:
+    """Index of `name:` (or `name -`) in the lowercased record, or -1."""
+    index = lowered.find(name, start)
+    while index != -1:
+        rest = lowered[index + len(name):index + len(name) + 3].lstrip()
+        if rest[:1] in (":", "-", "–") and (index == 0 or not lowered[index - 1].isalpha()):
+            return index
+        index = lowered.find(name, index + 1)
+    return -1
+
+
+def _split_priced(part: str) -> Tuple[str, Optional[int]]:
+    """`Eco Homestay - ₹2,800.` -> ("Eco Homestay", 2800)."""
+    amount = None
+    name_end = len(part)
+    for m in AMOUNT.finditer(part):
+        amount = int(float(m.group(2).replace(",", "") or 0))
+        name_end = m.start()
+    name = part[:name_end].strip().rstrip("-–—:(").strip()
+    return name, amount
+
+
+class ItineraryParser:
+    """Line-oriented parser for `Day N: City - Places. Stay: X - ₹A. Food: Y - ₹B. Cost: ₹C`.
+
+    feed() takes chunks as they stream in and returns each day once it is
+    complete; close() flushes the rest. A day may wrap over a few lines or
+    share a line with the next one. Each day is parsed once, so the work is
+    linear in the input. Days that drift from the format are repaired where
+    possible and everything notable goes to `diagnostics`.
+    """
+
+    def __init__(self, places=None, budget: Optional[float] = None, duration: Optional[int] = None):
+        self.places = places
+        self.budget = budget
+        self.max_per_day = budget / max(duration, 1) if budget and duration else None
+        self.days: List[dict] = []
+        self.diagnostics: List[dict] = []
+        self.total = 0
+        self.seen_days = set()
+        self.line_no = 0
+        self._partial: List[str] = []
+        self._record: List[str] = []
+        self._record_line = 0
+        self._record_day = 0
+        self._closed = False
+
+    # Streaming interface
+    def feed(self, chunk: str) -> List[dict]:
+        if "\n" not in chunk:
+            self._partial.append(chunk)
+            return []
+        head, *lines, tail = chunk.split("\n")
+        self._partial.append(head)
+        lines.insert(0, "".join(self._partial))
+        self._partial = [tail]
+        days = []
+        for line in lines:
+            days.extend(self._line(line))
+        return days
+
+    def close(self) -> List[dict]:
+        if self._closed:
+            return []
+        self._closed = True
+        days = self._line("".join(self._partial))
+        self._partial = []
+        days.extend(self._flush())
+        if self.budget and self.total > self.budget:
+            self._note(None, None, "warning", "over_budget",
+                       f"total ₹{self.total:,} exceeds the budget of ₹{self.budget:,.0f}")
+        return days
+
+    # Tokenizer
+    def _line(self, line: str) -> List[dict]:
+        self.line_no += 1
+        line = line.replace("**", "").strip()
+        if not line:
+            return []
+        days = []
+        start = DAY_START.match(line)
+        if start:
+            days.extend(self._flush())
+            self._open(int(start.group(1)))
+            pos = start.end()
+        elif self._record:
+            pos = 0
+        else:
+            return []
+
+        # Several days on one line: cut at the next inline `Day N:` once the current one has its cost.
+        lowered = line.lower()
+        while True:
+            cost_at = _find_field(lowered, "cost", pos)
+            nxt = DAY_INLINE.search(line, cost_at) if cost_at != -1 else None
+            if nxt is None:
+                break
+            self._record.append(line[pos:nxt.start()])
+            days.extend(self._flush())
+            self._open(int(nxt.group(1)))
+            pos = nxt.end()
+        self._record.append(line[pos:])
+
+        if self._complete() or len(self._record) >= MAX_RECORD_LINES:
+            days.extend(self._flush())
+        return days
+
+    def _open(self, day: int):
+        self._record = []
+        self._record_day = day
+        self._record_line = self.line_no
+
+    def _complete(self) -> bool:
+        lowered = self._record[-1].lower()
+        cost_at = _find_field(lowered, "cost")
+        return cost_at != -1 and parse_amount(lowered[cost_at:]) is not None
+
+    def _flush(self) -> List[dict]:
+        if not self._record:
+            return []
+        text, self._record = " ".join(self._record), []
+        if self._record_day in self.seen_days:
+            self._note(self._record_line, self._record_day, "warning", "duplicate_day", "day repeated, keeping the first")
+            return []
+        day = self._parse_record(self._record_day, text, self._record_line)
+        if day is None:
+            return []
+        if self.days and day["day"] != self.days[-1]["day"] + 1:
+            self._note(self._record_line, day["day"], "warning", "day_out_of_order",
+                       f"expected day {self.days[-1]['day'] + 1}")
+        self.seen_days.add(day["day"])
+        self.days.append(day)
+        self.total += day["cost"]
+        return [day]
+
+    # Record grammar
+    def _parse_record(self, number: int, text: str, line: int) -> Optional[dict]:
+        lowered = text.lower()
+        marks = {name: _find_field(lowered, name) for name in FIELDS}
+        ends = sorted([i for i in marks.values() if i != -1] + [len(text)])
+
+        def field(name: str) -> Optional[str]:
+            index = marks[name]
+            if index == -1:
+                return None
+            value_start = index + len(name)
+            end = next(e for e in ends if e > index)
+            return text[value_start:end].lstrip(" :-–").strip().rstrip(".").strip()
+
+        head_end = ends[0]
+        head = text[:head_end].strip().rstrip(".").strip()
+        city, destinations = self._split_head(head)
+        if not city:
+            self._note(line, number, "error", "missing_city", "no `City - Places` before the details")
+            return None
+
+        stay_name, stay_cost = _split_priced(field("stay") or "")
+        food_name, food_cost = _split_priced(field("food") or "")
+        cost_text = field("cost")
+        cost = parse_amount(cost_text) if cost_text is not None else None
+
+        if cost is None:
+            if stay_cost is not None and food_cost is not None:
+                cost = stay_cost + food_cost
+                self._note(line, number, "warning", "cost_derived", "no day cost, using stay + food")
+            else:
+                self._note(line, number, "error", "missing_cost", "no day cost")
+                return None
+        if cost <= 0:
+            self._note(line, number, "error", "invalid_cost", f"day cost ₹{cost:,}")
+            return None
+        for name, value in (("stay", stay_name), ("food", food_name)):
+            if not value:
+                self._note(line, number, "warning", f"missing_{name}", f"no {name} given")
+        if stay_cost is not None and food_cost is not None and cost < stay_cost + food_cost:
+            self._note(line, number, "warning", "cost_mismatch",
+                       f"day cost ₹{cost:,} is below stay + food ₹{stay_cost + food_cost:,}, using stay + food")
+            cost = stay_cost + food_cost
+        if self.max_per_day and cost > self.max_per_day:
+            self._note(line, number, "warning", "over_daily_budget",
+                       f"₹{cost:,} exceeds ₹{self.max_per_day:,.0f} per day")
+        self._validate_places(line, number, city, destinations)
+
+        return {
+            "day": number,
+            "city": city,
+            "destinations": destinations,
+            "stay": f"{stay_name} - ₹{stay_cost}" if stay_cost is not None else stay_name or "-",
+            "food": f"{food_name} - ₹{food_cost}" if food_cost is not None else food_name or "-",
+            "cost": cost
+        }
+
+    @staticmethod
+    def _split_head(head: str) -> Tuple[str, List[str]]:
+        for sep in (" - ", " – ", " — ", "-", "–", ":"):
+            index = head.find(sep)
+            if index > 0:
+                city, rest = head[:index], head[index + len(sep):]
+                break
+        else:
+            return head.strip(), []
+        destinations = [d.strip().rstrip(".").strip() for d in rest.split(",")]
+        return city.strip(), [d for d in destinations if d]
+
+    def _validate_places(self, line: int, number: int, city: str, destinations: List[str]):
+        if self.places is None:
+            return
+        if " ".join(city.lower().split()) not in self.places.indexes["city"]:
+            self._note(line, number, "warning", "unknown_city", f"{city} is not in the places table")
+        for name in destinations:
+            if self.places.find(name) is None and self.places.find(name.split("(")[0]) is None:
+                self._note(line, number, "warning", "unknown_place", f"{name} is not in the places table")
+
+    def _note(self, line: Optional[int], day: Optional[int], level: str, code: str, message: str):
+        self.diagnostics.append({"line": line, "day": day, "level": level, "code": code, "message": message})
+
+
+def parse_itinerary(text: str, places=None, budget: Optional[float] = None,
+                    duration: Optional[int] = None) -> Tuple[List[dict], int, List[dict]]:
+    """Parse a complete LLM answer; returns (days, total cost, diagnostics)."""
+    parser = ItineraryParser(places, budget, duration)
+    parser.feed(text)
+    parser.close()
+    return parser.days, parser.total, parser.diagnostics
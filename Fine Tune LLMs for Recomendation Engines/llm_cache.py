@@ -0,0 +1,168 @@
+# llm_cache.py
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+def make_key(*parts: Any) -> str:
+    """Stable hash of JSON-serialisable parts, used as the exact-tier key."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(str(text or "").lower().split())
+
+
+def normalize_preferences(preferences: List[str]) -> List[str]:
+    return sorted({normalize_text(p) for p in preferences or [] if normalize_text(p)})
+
+
+def _unit(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class _Entry:
+    __slots__ = ("namespace", "value", "expires_at", "embedding")
+
+    def __init__(self, namespace: str, value: str, expires_at: float, embedding: Optional[List[float]]):
+        self.namespace = namespace
+        self.value = value
+        self.expires_at = expires_at
+        self.embedding = embedding
+
+
+class GenerationCache:
+    """Two-tier LLM response cache.
+
+    The exact tier is an LRU keyed on a hash of the normalized request. The
+    semantic tier reuses an entry from the same namespace whose stored
+    embedding has cosine similarity >= `semantic_threshold` with the query.
+    Semantic hits are counted as recovered exact-tier misses.
+    Entries expire after `ttl` seconds. When `db_path` is set, every entry is
+    written through to SQLite and reloaded on startup.
+
+    The in-memory lock only guards dictionary updates: semantic scoring and
+    SQLite writes happen outside it, so a slow lookup or commit does not
+    hold up other callers. Callers on an event loop should still use a
+    worker thread (asyncio.to_thread).
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600,
+                 semantic_threshold: float = 0.92, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db = None
+        if db_path:
+            self._open_db(db_path)
+
+    # Persistence
+    def _open_db(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "key TEXT PRIMARY KEY, namespace TEXT, value TEXT, embedding TEXT, expires_at REAL)"
+        )
+        self._db.execute("DELETE FROM generations WHERE expires_at < ?", (time.time(),))
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT key, namespace, value, embedding, expires_at FROM generations "
+            "ORDER BY expires_at DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        for key, namespace, value, embedding, expires_at in reversed(rows):
+            vector = json.loads(embedding) if embedding else None
+            self._entries[key] = _Entry(namespace, value, expires_at, vector)
+
+    def _db_write(self, put: Optional[tuple] = None, deleted: List[str] = ()):
+        """Write one entry and drop evicted/expired keys in a single transaction."""
+        if self._db is None or (put is None and not deleted):
+            return
+        with self._db_lock:
+            if put is not None:
+                key, entry = put
+                embedding = json.dumps(entry.embedding) if entry.embedding else None
+                self._db.execute(
+                    "INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?)",
+                    (key, entry.namespace, entry.value, embedding, entry.expires_at),
+                )
+            if deleted:
+                self._db.executemany("DELETE FROM generations WHERE key = ?", [(k,) for k in deleted])
+            self._db.commit()
+
+    # Lookups
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            expired = entry is not None and entry.expires_at < time.time()
+            if entry is not None and not expired:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if expired:
+                del self._entries[key]
+            self.misses += 1
+        if expired:
+            self._db_write(deleted=[key])
+        return None
+
+    def get_similar(self, namespace: str, embedding: List[float]) -> Optional[str]:
+        """Return the closest cached value in `namespace` above the similarity threshold."""
+        query = _unit(embedding)
+        now = time.time()
+        with self._lock:
+            candidates = [(key, entry) for key, entry in self._entries.items()
+                          if entry.namespace == namespace and entry.embedding is not None and entry.expires_at >= now]
+        best, best_score = None, self.semantic_threshold
+        for key, entry in candidates:
+            score = sum(a * b for a, b in zip(query, entry.embedding))
+            if score >= best_score:
+                best, best_score = (key, entry), score
+        if best is None:
+            return None
+        key, entry = best
+        with self._lock:
+            if self._entries.get(key) is entry:
+                self._entries.move_to_end(key)
+            self.semantic_hits += 1
+        return entry.value
+
+    def put(self, key: str, value: str, namespace: str = "", embedding: Optional[List[float]] = None):
+        entry = _Entry(namespace, value, time.time() + self.ttl, _unit(embedding) if embedding else None)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                evicted.append(old_key)
+            self.evictions += len(evicted)
+        self._db_write((key, entry), evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+            "persistent": self._db is not None,
+        }
@@ -0,0 +1,340 @@
+# llm_client.py
+import asyncio
+import json
+import random
+import time
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+from metrics import LLM_FALLBACKS, LLM_RETRIES, LLM_SECONDS, LLM_TOKENS
+
+
+class LLMError(Exception):
+    pass
+
+
+class BudgetExhaustedError(LLMError):
+    """The latency budget ran out before another attempt could start."""
+
+
+class SaturatedError(LLMError):
+    """No backend slot freed up within the latency budget."""
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and stays open for
+    `reset_timeout` seconds. After that it lets a single probe through
+    (half-open); the probe's outcome closes or re-opens the circuit."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def release_probe(self):
+        """End a probe that never produced an outcome (no slot, cancelled) so the next call can probe."""
+        self.probing = False
+
+
+class Backend:
+    def __init__(self, name: str, url: str, concurrency: int, breaker: CircuitBreaker,
+                 headers: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.url = url
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.breaker = breaker
+        self.headers = headers or {}
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return isinstance(e, httpx.TransportError)
+
+
+class LLMClient:
+    """Pooled async client for the Ollama primary and the xAI fallback.
+
+    Each call gets a latency budget. The primary may use
+    `1 - fallback_share` of it and the fallback gets whatever is left.
+    Waiting for a backend's concurrency slot counts against the same budget.
+
+    Callers can split a prompt into a shared `prefix` and a varying tail;
+    both backends get `prefix + prompt` as one prompt. Keeping the shared
+    part first lets Ollama reuse the KV cache for the matching token prefix,
+    and `keep_alive` keeps the model (and that cache) loaded between calls.
+    """
+
+    def __init__(self, ollama_url: str, xai_url: str, xai_key: Optional[str] = None,
+                 ollama_concurrency: int = 2, xai_concurrency: int = 5,
+                 latency_budget: float = 120.0, fallback_share: float = 0.35,
+                 max_retries: int = 2, backoff_base: float = 0.25, backoff_max: float = 4.0,
+                 breaker_threshold: int = 3, breaker_reset: float = 30.0,
+                 max_connections: int = 20, keep_alive: Optional[str] = "30m"):
+        self.latency_budget = latency_budget
+        self.fallback_share = fallback_share
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_connections = max_connections
+        self.ollama = Backend("ollama", ollama_url, ollama_concurrency,
+                              CircuitBreaker(breaker_threshold, breaker_reset))
+        self.xai = Backend("grok", xai_url, xai_concurrency,
+                           CircuitBreaker(breaker_threshold, breaker_reset),
+                           {"Authorization": f"Bearer {xai_key}"} if xai_key else None)
+        self.xai_enabled = bool(xai_key)
+        self.keep_alive = keep_alive
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=httpx.Timeout(self.latency_budget, connect=5.0),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def status(self) -> Dict[str, str]:
+        return {b.name: b.breaker.state for b in (self.ollama, self.xai)}
+
+    # Single requests
+    def _ollama_payload(self, prompt: str, model: str, temperature: float, stream: bool) -> dict:
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {"temperature": temperature, "top_p": 0.9}
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    async def _ollama_request(self, timeout: float, payload: dict) -> dict:
+        model = payload["model"]
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            r = await self.client.post(self.ollama.url, json=payload, timeout=timeout)
+            r.raise_for_status()
+            data = r.json()
+            outcome = "ok"
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - started, backend="ollama", model=model, outcome=outcome)
+        LLM_TOKENS.inc(data.get("prompt_eval_count", 0), backend="ollama", model=model, kind="prompt")
+        LLM_TOKENS.inc(data.get("eval_count", 0), backend="ollama", model=model, kind="completion")
+        return data
+
+    async def _ollama_once(self, timeout: float, prompt: str, model: str, temperature: float) -> str:
+        data = await self._ollama_request(timeout, self._ollama_payload(prompt, model, temperature, False))
+        return data["response"]
+
+    async def _xai_once(self, timeout: float, prompt: str, temperature: float) -> str:
+        payload = {
+            "model": "grok-beta",
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature
+        }
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            r = await self.client.post(self.xai.url, json=payload, headers=self.xai.headers, timeout=timeout)
+            r.raise_for_status()
+            data = r.json()
+            outcome = "ok"
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - started, backend="grok", model=payload["model"], outcome=outcome)
+        usage = data.get("usage") or {}
+        LLM_TOKENS.inc(usage.get("prompt_tokens", 0), backend="grok", model=payload["model"], kind="prompt")
+        LLM_TOKENS.inc(usage.get("completion_tokens", 0), backend="grok", model=payload["model"], kind="completion")
+        return data["choices"][0]["message"]["content"]
+
+    async def _call(self, backend: Backend, deadline: float, fn, *args) -> str:
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise BudgetExhaustedError(f"{backend.name}: latency budget exhausted")
+            try:
+                await asyncio.wait_for(backend.semaphore.acquire(), remaining)
+            except asyncio.TimeoutError:
+                raise SaturatedError(f"{backend.name}: saturated, no slot within budget")
+            try:
+                result = await fn(max(deadline - loop.time(), 0.001), *args)
+            except Exception as e:
+                error = e
+                backend.breaker.record_failure()
+            else:
+                backend.breaker.record_success()
+                return result
+            finally:
+                backend.semaphore.release()
+
+            if not _retryable(error) or attempt == self.max_retries or not backend.breaker.allow():
+                raise error
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            if loop.time() + delay >= deadline:
+                raise error
+            print(f"{backend.name} attempt {attempt + 1} failed ({error}), retrying in {delay:.2f}s")
+            LLM_RETRIES.inc(backend=backend.name)
+            await asyncio.sleep(delay)
+        raise LLMError(f"{backend.name}: retries exhausted")
+
+    # Public API
+    async def generate(self, prompt: str, model: str = "phi3:mini", temperature: float = 0.2,
+                       budget: Optional[float] = None, fallback: bool = True, prefix: str = "") -> str:
+        """Generate `prefix + prompt` with Ollama and fall back to xAI. Returns "" if both fail."""
+        loop = asyncio.get_running_loop()
+        budget = budget or self.latency_budget
+        deadline = loop.time() + budget
+        use_fallback = fallback and self.xai_enabled
+
+        if self.ollama.breaker.allow():
+            probe = self.ollama.breaker.probing
+            primary_deadline = deadline - (budget * self.fallback_share if use_fallback else 0)
+            try:
+                answer = await self._call(self.ollama, primary_deadline, self._ollama_once,
+                                          prefix + prompt, model, temperature)
+                if answer.strip():
+                    return answer
+                reason = "empty_response"
+            except SaturatedError as e:
+                print(f"Ollama error: {e}")
+                reason = "saturated"
+            except BudgetExhaustedError as e:
+                print(f"Ollama error: {e}")
+                reason = "budget_exhausted"
+            except Exception as e:
+                print(f"Ollama error: {e}")
+                reason = "primary_error"
+            finally:
+                if probe:
+                    self.ollama.breaker.release_probe()
+        else:
+            print("Ollama circuit open, routing to fallback")
+            reason = "breaker_open"
+
+        if not use_fallback:
+            return ""
+        LLM_FALLBACKS.inc(reason=reason)
+        if not self.xai.breaker.allow():
+            print("Grok circuit open, giving up")
+            return ""
+        probe = self.xai.breaker.probing
+        try:
+            return await self._call(self.xai, deadline, self._xai_once, prefix + prompt, temperature)
+        except Exception as e:
+            print(f"Grok API error: {e}")
+            return ""
+        finally:
+            if probe:
+                self.xai.breaker.release_probe()
+
+    async def stream(self, prompt: str, model: str = "phi3:mini", temperature: float = 0.2,
+                     budget: Optional[float] = None, fallback: bool = True, prefix: str = "") -> AsyncIterator[str]:
+        """Yield response fragments of `prefix + prompt` from Ollama's streaming API.
+
+        If Ollama fails before the first fragment, the full xAI answer is
+        yielded as a single fragment instead. A failure mid-stream ends the
+        stream; nothing is retried once tokens have been sent.
+        """
+        loop = asyncio.get_running_loop()
+        budget = budget or self.latency_budget
+        deadline = loop.time() + budget
+        started = False
+        reason = "breaker_open"
+        if self.ollama.breaker.allow():
+            probe = self.ollama.breaker.probing
+            try:
+                payload = self._ollama_payload(prefix + prompt, model, temperature, True)
+                await asyncio.wait_for(self.ollama.semaphore.acquire(), max(deadline - loop.time(), 0.001))
+                call_started = time.perf_counter()
+                outcome = "error"
+                try:
+                    async with self.client.stream("POST", self.ollama.url, json=payload,
+                                                  timeout=max(deadline - loop.time(), 0.001)) as r:
+                        r.raise_for_status()
+                        async for line in r.aiter_lines():
+                            if not line:
+                                continue
+                            chunk = json.loads(line)
+                            if chunk.get("response"):
+                                started = True
+                                yield chunk["response"]
+                            if chunk.get("done"):
+                                LLM_TOKENS.inc(chunk.get("prompt_eval_count", 0), backend="ollama", model=model, kind="prompt")
+                                LLM_TOKENS.inc(chunk.get("eval_count", 0), backend="ollama", model=model, kind="completion")
+                                break
+                    outcome = "ok"
+                finally:
+                    self.ollama.semaphore.release()
+                    LLM_SECONDS.observe(time.perf_counter() - call_started, backend="ollama", model=model, outcome=outcome)
+                self.ollama.breaker.record_success()
+                if started:
+                    return
+                reason = "empty_response"
+            except asyncio.TimeoutError:
+                print("Ollama stream: saturated, no slot within budget")
+                reason = "saturated"
+            except Exception as e:
+                self.ollama.breaker.record_failure()
+                print(f"Ollama stream error: {e}")
+                if started:
+                    return
+                reason = "primary_error"
+            finally:
+                if probe:
+                    self.ollama.breaker.release_probe()
+        else:
+            print("Ollama circuit open, routing to fallback")
+
+        if fallback and self.xai_enabled:
+            LLM_FALLBACKS.inc(reason=reason)
+        if fallback and self.xai_enabled and self.xai.breaker.allow():
+            probe = self.xai.breaker.probing
+            try:
+                answer = await self._call(self.xai, deadline, self._xai_once, prefix + prompt, temperature)
+                if answer:
+                    yield answer
+            except Exception as e:
+                print(f"Grok API error: {e}")
+            finally:
+                if probe:
+                    self.xai.breaker.release_probe()
@@ -1,39 +1,203 @@
 # main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import re
-import requests
+from contextlib import asynccontextmanager
 import os
-from typing import List, Dict, Any, Optional
-from datetime import datetime
-
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_ollama import OllamaLLM
-from langchain.prompts import PromptTemplate
+import asyncio
+import json
+import time
+from typing import List, Dict, Any, Literal, Optional, Tuple
+from datetime import date, datetime
+
+from context_compactor import compact_facts, compact_itineraries, compact_plan_places
+from llm_cache import GenerationCache, make_key, normalize_preferences, normalize_text
+from embed_batcher import EmbeddingBatcher
+from itinerary_parser import ItineraryParser
+from llm_client import LLMClient
+from metrics import ASK_RETRIEVAL, REQUEST_SECONDS, registry, request_timings, server_timing, span
+from optimizer import plan_options
+from places import PlaceIndex
+from retrieval import HybridRetriever, expand_preferences
+from sessions import ChatSession, SessionStore
 
 # Config
-OLLAMA_URL = "http://localhost:11434/api/generate"
-XAI_API_URL = "https://api.x.ai/v1/chat/completions"
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+XAI_API_URL = os.getenv("XAI_API_URL", "https://api.x.ai/v1/chat/completions")
 XAI_API_KEY = os.getenv("XAI_API_KEY")
+PLANNER_MODEL = "phi3:mini"
+CHAT_MODEL = "qwen2.5:7b-instruct-q4_K_M"
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Startup
+STARTUP_WAIT = float(os.getenv("STARTUP_WAIT", "30"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+MODEL_WARMUP_TIMEOUT = float(os.getenv("MODEL_WARMUP_TIMEOUT", "300"))
+
+# Instrumentation
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+
+# Planner concurrency
+PLAN_OPTIONS = 5
+PLAN_MIN_OPTIONS = int(os.getenv("PLAN_MIN_OPTIONS", "3"))  # cancel the rest once this many parse
+PLAN_OPTION_TIMEOUT = float(os.getenv("PLAN_OPTION_TIMEOUT", "150"))
+PLAN_CONTEXT_K = int(os.getenv("PLAN_CONTEXT_K", "12"))
+ASK_CONTEXT_K = int(os.getenv("ASK_CONTEXT_K", "5"))
+
+# Prompt token budgets (estimated tokens)
+PLAN_CONTEXT_TOKENS = int(os.getenv("PLAN_CONTEXT_TOKENS", "600"))
+ASK_ITINERARY_TOKENS = int(os.getenv("ASK_ITINERARY_TOKENS", "800"))
+ASK_FACTS_TOKENS = int(os.getenv("ASK_FACTS_TOKENS", "400"))
+OPTIMIZER_CANDIDATES = int(os.getenv("OPTIMIZER_CANDIDATES", "40"))
+
+# Shared LLM client: pooled connections, per-backend limits, retries, circuit breaking
+llm = LLMClient(
+    OLLAMA_URL, XAI_API_URL, XAI_API_KEY,
+    ollama_concurrency=int(os.getenv("OLLAMA_CONCURRENCY", "2")),
+    xai_concurrency=int(os.getenv("XAI_CONCURRENCY", "5")),
+    latency_budget=float(os.getenv("LLM_LATENCY_BUDGET", "120")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+    breaker_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "3")),
+    breaker_reset=float(os.getenv("LLM_BREAKER_RESET", "30")),
+    keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+)
+
+# Generation cache
+generation_cache = GenerationCache(
+    max_entries=int(os.getenv("GEN_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("GEN_CACHE_TTL", "21600")),
+    semantic_threshold=float(os.getenv("ASK_SEMANTIC_THRESHOLD", "0.92")),
+    db_path=os.getenv("GEN_CACHE_DB") or None,
+)
+
+# Chat sessions
+sessions = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX", "1000")),
+    ttl=float(os.getenv("SESSION_TTL", "21600")),
+    max_bytes=int(float(os.getenv("SESSION_MAX_MB", "64")) * 1024 * 1024),
+    db_path=os.getenv("SESSION_DB") or None,
+)
+SESSION_REUSE_THRESHOLD = float(os.getenv("SESSION_REUSE_THRESHOLD", "0.85"))
+SESSION_HISTORY_TURNS = int(os.getenv("SESSION_HISTORY_TURNS", "3"))
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "300"))
+
+# Heavy components, loaded in the background by warm_up()
+embeddings = None
+db = None
+places = None
+retriever = None
+rag_ready = asyncio.Event()
+started_at = time.time()
+components: Dict[str, Dict[str, Any]] = {
+    name: {"state": "pending", "load_seconds": None}
+    for name in ("places", "embeddings", "vector_store", "planner_model", "chat_model")
+}
+
+def load_places():
+    global places
+    places = PlaceIndex.load("data/places.csv")
+    print(f"Indexed {len(places)} places")
+
+def load_embeddings():
+    global embeddings
+    from langchain_huggingface import HuggingFaceEmbeddings
+    embeddings = EmbeddingBatcher(
+        HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL),
+        max_batch=EMBED_BATCH_SIZE, max_wait=EMBED_BATCH_WAIT_MS / 1000, cache_size=EMBED_CACHE_SIZE,
+    )
+    embeddings.embed_query("warm up")
+
+def load_vector_store():
+    global db, retriever
+    from langchain_chroma import Chroma
+    db = Chroma(persist_directory="chroma_db", embedding_function=embeddings)
+    retriever = HybridRetriever(db, places, embed=embeddings.embed_query)
+    retriever.search("heritage near Delhi", 1)
+
+async def warm_model(model: str):
+    answer = await llm.generate("Reply with OK.", model=model, temperature=0.0,
+                                budget=MODEL_WARMUP_TIMEOUT, fallback=False)
+    if not answer.strip():
+        raise RuntimeError(f"{model} did not respond")
+
+async def track(name: str, load) -> bool:
+    component = components[name]
+    component["state"] = "loading"
+    started = time.perf_counter()
+    try:
+        await load()
+        component["state"] = "ready"
+    except Exception as e:
+        component["state"] = "failed"
+        component["error"] = str(e)
+        print(f"Startup: {name} failed: {e}")
+    component["load_seconds"] = round(time.perf_counter() - started, 3)
+    return component["state"] == "ready"
+
+async def warm_up():
+    print("Loading RAG index in the background...")
+    for name, load in (("places", load_places), ("embeddings", load_embeddings), ("vector_store", load_vector_store)):
+        if not await track(name, lambda load=load: asyncio.to_thread(load)):
+            return
+    rag_ready.set()
+    print("RAG index ready, warming up Ollama models...")
+    await asyncio.gather(
+        track("planner_model", lambda: warm_model(PLANNER_MODEL)),
+        track("chat_model", lambda: warm_model(CHAT_MODEL)),
+    )
+
+async def require_rag():
+    """Hold requests that arrive during startup; 503 if the index is not up in time."""
+    if rag_ready.is_set():
+        return
+    if not any(c["state"] == "failed" for c in components.values()):
+        try:
+            await asyncio.wait_for(rag_ready.wait(), STARTUP_WAIT)
+            return
+        except asyncio.TimeoutError:
+            pass
+    raise HTTPException(status_code=503, detail="Touristique is starting up, please retry shortly.")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    await llm.aclose()
+    if embeddings is not None:
+        embeddings.close()
 
 # FastAPI setup
-app = FastAPI(title="Touristique API", version="2.0")
+app = FastAPI(title="Touristique API", version="2.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://localhost:3000"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
-print("Loading RAG index...")
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-db = Chroma(persist_directory="chroma_db", embedding_function=embeddings)
-
-print("Loading Qwen chatbot model...")
-qwen_llm = OllamaLLM(model="qwen2.5:7b-instruct-q4_K_M", temperature=0.3)
+@app.middleware("http")
+async def time_request(request: Request, call_next):
+    """Time every request and expose its stage spans as a Server-Timing header.
+    Streaming responses are timed to their first byte; their stages still go to /metrics."""
+    timings = []
+    token = request_timings.set(timings)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_timings.reset(token)
+    elapsed = time.perf_counter() - started
+    path = request.url.path if response.status_code != 404 else "unmatched"
+    REQUEST_SECONDS.observe(elapsed, path=path, status=str(response.status_code))
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = server_timing(timings, elapsed)
+    return response
 
 print("Trips storage disabled")
 
@@ -43,92 +207,28 @@ class TripRequest(BaseModel):
     duration: int = 2
     budget: float = 15000
     start_city: str = "Delhi"
+    start_date: Optional[date] = None
+    planner: Literal["llm", "fast", "narrate"] = "llm"  # "fast": optimizer only; "narrate": optimizer + LLM narration
 
 class AskRequest(BaseModel):
     question: str
     preferences: List[str] = []
+    session_id: Optional[str] = None  # from /plan or a previous /ask; replaces resending the options
     chosen_options: Optional[List[dict]] = None
     selected_option: Optional[dict] = None
+    selected_option_number: Optional[int] = None
 
 # Helper functions
-def get_field(content: str, key: str, default: str = "?") -> str:
-    for line in content.split("\n"):
-        if line.startswith(f"{key}:"):
-            return line.split(":", 1)[1].strip()
-    return default
-
-def query_ollama(prompt: str, model: str = "phi3:mini", temperature: float = 0.2) -> str:
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": False,
-        "options": {"temperature": temperature, "top_p": 0.9}
-    }
-    try:
-        r = requests.post(OLLAMA_URL, json=payload, timeout=120)
-        r.raise_for_status()
-        return r.json()["response"]
-    except Exception as e:
-        print(f"Ollama error: {e}")
-        return ""
-
-def query_grok(prompt: str, temperature: float = 0.2) -> str:
-    if not XAI_API_KEY:
-        return ""
-    headers = {
-        "Authorization": f"Bearer {XAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": "grok-beta",
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": temperature
-    }
-    try:
-        r = requests.post(XAI_API_URL, json=payload, headers=headers, timeout=60)
-        r.raise_for_status()
-        return r.json()["choices"][0]["message"]["content"]
-    except Exception as e:
-        print(f"Grok API error: {e}")
-        return ""
-
-def robust_parse_itinerary(text: str):
-    pattern = r"Day\s*(\d+):\s*([^-]+?)\s*-\s*(.+?)\.\s*Stay:\s*(.+?)\s*-\s*[₹₹]?[\s]*([\d,]+)\s*\.\s*Food:\s*(.+?)\s*-\s*[₹₹]?[\s]*([\d,]+)\s*\.\s*Cost:\s*[₹₹]?[\s]*([\d,]+)"
-    matches = re.findall(pattern, text, re.IGNORECASE | re.DOTALL)
+def itinerary_parser(req: TripRequest) -> ItineraryParser:
+    """Parser that checks destinations against the places table and costs against the request budget."""
+    return ItineraryParser(places, req.budget, req.duration)
 
-    itinerary = []
-    total = 0
-    for m in matches:
-        day, city, dest, stay, stay_c, food, food_c, day_c = m
-        try:
-            cost = int(day_c.replace(",", "").replace("₹", "").strip())
-            total += cost
-            itinerary.append({
-                "day": int(day),
-                "city": city.strip(),
-                "destinations": [d.strip() for d in dest.split(",") if d.strip()],
-                "stay": f"{stay.strip()} - ₹{stay_c.replace(',', '')}",
-                "food": f"{food.strip()} - ₹{food_c.replace(',', '')}",
-                "cost": cost
-            })
-        except:
-            continue
-    return itinerary, total
-
-def generate_single_itinerary(context: str, req: TripRequest, variation_num: int, temperature: float):
+def plan_prompt_prefix(context: str, req: TripRequest) -> str:
+    """The part of the planner prompt shared by every variation. It must stay
+    byte-identical across the variations so Ollama processes it only once."""
     max_per_day = req.budget // req.duration
-    
-    variation_hints = [
-        "Focus on popular tourist spots and well-known attractions.",
-        "Prioritize off-beat, less crowded hidden gems and local experiences.",
-        "Balance between famous landmarks and local cultural experiences.",
-        "Emphasize adventure activities and outdoor experiences.",
-        "Focus on heritage sites, museums, and historical places."
-    ]
-    
-    hint = variation_hints[variation_num % len(variation_hints)]
-    
-    prompt = f"""
+
+    return f"""
 You are Touristique, India's smartest AI travel planner. Follow instructions EXACTLY.
 
 USER REQUEST:
@@ -136,7 +236,6 @@ USER REQUEST:
 - Duration: {req.duration} days
 - Budget: ₹{req.budget:,}
 - Start: {req.start_city}
-- Style: {hint}
 
 AVAILABLE PLACES (USE ONLY THESE):
 {context}
@@ -148,60 +247,216 @@ RULES:
 4. Cost per day ≤ ₹{max_per_day:,}
 5. Create a UNIQUE itinerary different from typical tourist routes.
 6. Output PLAIN TEXT ONLY. No markdown, JSON, or code.
+7. Follow the Style given at the end.
 
 OUTPUT FORMAT (COPY EXACTLY):
 Day 1: Jaipur - Amber Fort. Stay: Eco Homestay - ₹2,800. Food: Dal Baati - ₹600. Cost: ₹5,400
 Day 2: Jaipur - Hawa Mahal, City Palace. Stay: Eco Homestay - ₹2,800. Food: Pyaaz Kachori - ₹500. Cost: ₹6,300
+""".lstrip()
 
-Generate the {req.duration}-day itinerary now:
-""".strip()
-
-    answer = query_ollama(prompt, model="phi3:mini", temperature=temperature)
+def plan_prompt_suffix(req: TripRequest, variation_num: int) -> str:
+    variation_hints = [
+        "Focus on popular tourist spots and well-known attractions.",
+        "Prioritize off-beat, less crowded hidden gems and local experiences.",
+        "Balance between famous landmarks and local cultural experiences.",
+        "Emphasize adventure activities and outdoor experiences.",
+        "Focus on heritage sites, museums, and historical places."
+    ]
     
-    if not answer.strip() or "error" in answer.lower():
-        answer = query_grok(prompt, temperature)
+    hint = variation_hints[variation_num % len(variation_hints)]
     
-    return answer
+    return f"""
+Style: {hint}
+
+Generate the {req.duration}-day itinerary now:
+""".rstrip()
+
+def build_plan_prompt(context: str, req: TripRequest, variation_num: int) -> Tuple[str, str]:
+    """(shared prefix, variation suffix); the full prompt is their concatenation."""
+    return plan_prompt_prefix(context, req), plan_prompt_suffix(req, variation_num)
+
+async def generate_single_itinerary(context: str, req: TripRequest, variation_num: int, temperature: float):
+    with span("prompt_build"):
+        prefix, prompt = build_plan_prompt(context, req, variation_num)
+    with span("generation"):
+        return await llm.generate(prompt, model=PLANNER_MODEL, temperature=temperature,
+                                  budget=PLAN_OPTION_TIMEOUT, prefix=prefix)
+
+def build_option(answer: str, req: TripRequest, i: int, parser: Optional[ItineraryParser] = None):
+    """Option dict for a finished answer; pass the parser that already consumed it while streaming."""
+    if parser is None:
+        with span("parsing"):
+            parser = itinerary_parser(req)
+            parser.feed(answer)
+            parser.close()
+    if not parser.days or parser.total <= 0:
+        return None
+    return {
+        "option_number": i + 1,
+        "itinerary": parser.days,
+        "total_cost": parser.total,
+        "summary": f"{req.duration}-day trip for ₹{parser.total:,}",
+        "raw_output": answer,
+        "diagnostics": parser.diagnostics
+    }
+
+def plan_cache_key(context: str, req: TripRequest, variation_num: int, temperature: float) -> str:
+    return make_key(
+        "plan", PLANNER_MODEL,
+        normalize_preferences(req.preferences), req.duration, round(req.budget), normalize_text(req.start_city),
+        variation_num, temperature, make_key(context)
+    )
+
+async def generate_option(context: str, req: TripRequest, i: int, temperature: float):
+    key = plan_cache_key(context, req, i, temperature)
+    with span("cache_lookup"):
+        cached = await asyncio.to_thread(generation_cache.get, key)
+    if cached:
+        return await asyncio.to_thread(build_option, cached, req, i)
+
+    answer = await generate_single_itinerary(context, req, i, temperature)
+    option = await asyncio.to_thread(build_option, answer, req, i)
+    if option:
+        await asyncio.to_thread(generation_cache.put, key, answer)
+    return option
+
+async def stream_option(context: str, req: TripRequest, i: int, temperature: float, events: asyncio.Queue):
+    """Generate one option, pushing each completed day line onto `events` as it streams in."""
+    key = plan_cache_key(context, req, i, temperature)
+    with span("cache_lookup"):
+        cached = await asyncio.to_thread(generation_cache.get, key)
+    if cached:
+        option = await asyncio.to_thread(build_option, cached, req, i)
+        for day in option["itinerary"] if option else []:
+            await events.put({"type": "day", "option_number": i + 1, "day": day})
+        return option
+
+    with span("prompt_build"):
+        prefix, prompt = build_plan_prompt(context, req, i)
+    parser = itinerary_parser(req)
+    answer = ""
+    with span("generation"):
+        async for token in llm.stream(prompt, model=PLANNER_MODEL, temperature=temperature,
+                                      budget=PLAN_OPTION_TIMEOUT, prefix=prefix):
+            answer += token
+            for day in parser.feed(token):
+                await events.put({"type": "day", "option_number": i + 1, "day": day})
+    for day in parser.close():
+        await events.put({"type": "day", "option_number": i + 1, "day": day})
+
+    option = build_option(answer, req, i, parser)
+    if option:
+        await asyncio.to_thread(generation_cache.put, key, answer)
+    return option
+
+async def generate_options(context: str, req: TripRequest, temperatures: List[float]):
+    """Run all variations at once; drop late ones and stop once enough parse."""
+    tasks = [
+        asyncio.create_task(asyncio.wait_for(generate_option(context, req, i, t), PLAN_OPTION_TIMEOUT))
+        for i, t in enumerate(temperatures)
+    ]
+    options = []
+    try:
+        for fut in asyncio.as_completed(tasks):
+            try:
+                option = await fut
+            except asyncio.TimeoutError:
+                print(f"  Option timed out after {PLAN_OPTION_TIMEOUT:.0f}s, dropping")
+                continue
+            if option:
+                print(f"  Option {option['option_number']}/{len(tasks)} parsed")
+                options.append(option)
+                if len(options) >= PLAN_MIN_OPTIONS:
+                    break
+    finally:
+        for t in tasks:
+            t.cancel()
+    return options
+
+def ndjson(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+def search_plan_places(req: TripRequest, k: int):
+    query = f"{', '.join(req.preferences)} near {req.start_city}"
+    max_per_day = req.budget / max(req.duration, 1)
+    return retriever.search(
+        query, k,
+        keywords=expand_preferences(req.preferences), max_fee=max_per_day, **places.locate(req.start_city)
+    )
+
+def optimize_options(req: TripRequest) -> List[dict]:
+    start = places.locate(req.start_city)
+    with span("retrieval"):
+        candidates = search_plan_places(req, OPTIMIZER_CANDIDATES)
+        if start.get("state"):
+            # The solver only moves within the start state, so make sure all of it is on offer.
+            max_per_day = req.budget / max(req.duration, 1)
+            candidates += [p for p in places.filter(state=start["state"]) if p.fee <= max_per_day]
+    with span("optimizer"):
+        return plan_options(
+            candidates, req.duration, req.budget, req.start_city, req.preferences,
+            start_date=req.start_date, count=PLAN_OPTIONS, start_state=start.get("state", "")
+        )
+
+async def narrate_option(option: dict, req: TripRequest) -> dict:
+    prompt = f"""
+You are Touristique, India's smartest AI travel planner.
+Write a warm 3-4 sentence overview of this fixed {req.duration}-day itinerary for a traveller interested in {', '.join(req.preferences) or 'exploring India'}.
+Do not add, remove or reorder places and do not change any costs. Add one eco-friendly tip.
+
+{option["raw_output"]}
+""".strip()
+    with span("generation"):
+        narration = await llm.generate(prompt, model=PLANNER_MODEL, temperature=0.5, budget=PLAN_OPTION_TIMEOUT)
+    option["narration"] = narration.strip()
+    return option
+
+def mark_budget(options: List[dict], req: TripRequest) -> List[dict]:
+    for option in options:
+        option["within_budget"] = option["total_cost"] <= req.budget
+    options.sort(key=lambda x: (not x["within_budget"], x["total_cost"]))
+    return options
+
+async def build_plan_context(req: TripRequest):
+    with span("retrieval"):
+        docs = await asyncio.to_thread(search_plan_places, req, PLAN_CONTEXT_K)
+
+    with span("context_build"):
+        context_lines = compact_plan_places(docs, PLAN_CONTEXT_TOKENS)
+        context = "\n".join(context_lines) if context_lines else "No places found."
+    return docs, context
 
 @app.post("/plan")
-def plan_trip(req: TripRequest):
+async def plan_trip(req: TripRequest):
     print(f"Planning trip: {req.preferences} | {req.duration} days | Rs.{req.budget:,}")
+    await require_rag()
     
-    query = f"{', '.join(req.preferences)} near {req.start_city}"
-    docs = db.similarity_search(query, k=20)
-
-    context_lines = []
-    for d in docs:
-        place = get_field(d.page_content, "Place")
-        city = get_field(d.page_content, "City")
-        category = get_field(d.page_content, "Category")
-        fee = get_field(d.page_content, "Entry Fee", "500")
-        desc = get_field(d.page_content, "Description", "")
-        short_desc = (desc[:70] + "...") if len(desc) > 70 else desc
-        context_lines.append(f"- {place} ({city}): {category}, ₹{fee} — {short_desc}")
+    if req.planner in ("fast", "narrate"):
+        all_options = await asyncio.to_thread(optimize_options, req)
+        if req.planner == "narrate":
+            all_options = await asyncio.gather(*(narrate_option(o, req) for o in all_options))
+        print(f"Optimizer produced {len(all_options)} options")
+        all_options = mark_budget(list(all_options), req)
+        session = await asyncio.to_thread(sessions.create, req.preferences, all_options)
+        return {
+            "options": all_options,
+            "count": len(all_options),
+            "budget_limit": req.budget,
+            "planner": req.planner,
+            "session_id": session.session_id
+        }
 
-    context = "\n".join(context_lines) if context_lines else "No places found."
+    docs, context = await build_plan_context(req)
 
-    all_options = []
     temperatures = [0.3, 0.5, 0.7, 0.6, 0.4]
     
-    print(f"Generating 5 itinerary options...")
-    
-    for i in range(5):
-        print(f"  Option {i+1}/5 (temp={temperatures[i]})...")
-        
-        answer = generate_single_itinerary(context, req, i, temperatures[i])
-        itinerary, total = robust_parse_itinerary(answer)
-        
-        if itinerary and total > 0:
-            all_options.append({
-                "option_number": i + 1,
-                "itinerary": itinerary,
-                "total_cost": total,
-                "summary": f"{req.duration}-day trip for ₹{total:,}",
-                "raw_output": answer
-            })
+    print(f"Generating {PLAN_OPTIONS} itinerary options concurrently...")
+    all_options = await generate_options(context, req, temperatures[:PLAN_OPTIONS])
     
+    if not all_options:
+        print("No LLM option parsed, falling back to the optimizer")
+        all_options = await asyncio.to_thread(optimize_options, req)
+
     if not all_options:
         return {
             "options": [],
@@ -209,109 +464,295 @@ def plan_trip(req: TripRequest):
             "retrieved_places": context
         }
     
-    all_options.sort(key=lambda x: x["total_cost"])
+    mark_budget(all_options, req)
     
     print(f"Generated {len(all_options)} valid options")
+    session = await asyncio.to_thread(sessions.create, req.preferences, all_options)
     
     return {
         "options": all_options,
         "count": len(all_options),
         "budget_limit": req.budget,
-        "retrieved_places_count": len(docs)
+        "retrieved_places_count": len(docs),
+        "session_id": session.session_id
     }
 
-@app.post("/ask")
-def chat(req: AskRequest):
-    print(f"Chat query: {req.question[:50]}...")
-    
-    filt = {}
-    if req.preferences:
-        cats = [p.lower() for p in req.preferences if p.lower() in {"heritage", "food", "nature", "adventure", "spiritual", "beach"}]
-        if cats:
-            filt = {"category": {"$in": cats}}
-    
-    retriever = db.as_retriever(search_kwargs={"k": 5, "filter": filt or None})
-    docs = retriever.invoke(req.question)
-    context = "\n---\n".join([d.page_content for d in docs])
-    
-    options_context = ""
-    if req.chosen_options and len(req.chosen_options) > 0:
-        options_context = "\n\nUSER'S GENERATED ITINERARY OPTIONS:\n"
-        for opt in req.chosen_options[:5]:
-            opt_num = opt.get("option_number", "?")
-            total = opt.get("total_cost", 0)
-            options_context += f"\nOption {opt_num} (Total: ₹{total:,}):\n"
-            for day_info in opt.get("itinerary", []):
-                day = day_info.get("day")
-                city = day_info.get("city")
-                dests = ", ".join(day_info.get("destinations", []))
-                stay = day_info.get("stay", "-")
-                food = day_info.get("food", "-")
-                cost = day_info.get("cost", 0)
-                options_context += f"  Day {day} ({city}): {dests} | Stay: {stay} | Food: {food} | Cost: ₹{cost:,}\n"
-    
-    selected_context = ""
-    if req.selected_option:
-        sel = req.selected_option
-        selected_context = f"""
-
-USER'S SELECTED ITINERARY (Option {sel.get('option_number', '?')}):
-Total Cost: ₹{sel.get('total_cost', 0):,}
-"""
-        for day_info in sel.get("itinerary", []):
-            day = day_info.get("day")
-            city = day_info.get("city")
-            dests = ", ".join(day_info.get("destinations", []))
-            stay = day_info.get("stay", "-")
-            food = day_info.get("food", "-")
-            selected_context += f"\nDay {day} ({city}): {dests}\n  Stay: {stay} | Food: {food}\n"
-    
-    prompt_text = f"""
+@app.post("/plan/stream")
+async def plan_trip_stream(req: TripRequest):
+    print(f"Streaming trip plan: {req.preferences} | {req.duration} days | Rs.{req.budget:,}")
+    await require_rag()
+
+    if req.planner in ("fast", "narrate"):
+        return StreamingResponse(optimizer_events(req), media_type="application/x-ndjson")
+
+    docs, context = await build_plan_context(req)
+    temperatures = [0.3, 0.5, 0.7, 0.6, 0.4][:PLAN_OPTIONS]
+
+    async def events():
+        yield ndjson({
+            "type": "start",
+            "options": len(temperatures),
+            "budget_limit": req.budget,
+            "retrieved_places_count": len(docs)
+        })
+
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+
+        async def run(i: int, temperature: float):
+            try:
+                option = await asyncio.wait_for(stream_option(context, req, i, temperature, queue), PLAN_OPTION_TIMEOUT)
+                if option:
+                    mark_budget([option], req)
+                    await queue.put({"type": "option", "option": option})
+                else:
+                    await queue.put({"type": "failed", "option_number": i + 1})
+            except asyncio.TimeoutError:
+                await queue.put({"type": "timeout", "option_number": i + 1})
+            finally:
+                await queue.put(finished)
+
+        tasks = [asyncio.create_task(run(i, t)) for i, t in enumerate(temperatures)]
+        options = []
+        pending = len(tasks)
+        try:
+            while pending:
+                event = await queue.get()
+                if event is finished:
+                    pending -= 1
+                    continue
+                yield ndjson(event)
+                if event["type"] == "option":
+                    options.append(event["option"])
+                    if len(options) >= PLAN_MIN_OPTIONS:
+                        break
+        finally:
+            for t in tasks:
+                t.cancel()
+        if not options:
+            for option in mark_budget(await asyncio.to_thread(optimize_options, req), req):
+                options.append(option)
+                yield ndjson({"type": "option", "option": option})
+        yield ndjson(await plan_done_event(req, options))
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+async def plan_done_event(req: TripRequest, options: List[dict]) -> dict:
+    done = {"type": "done", "count": len(options)}
+    if options:
+        session = await asyncio.to_thread(sessions.create, req.preferences, options)
+        done["session_id"] = session.session_id
+    return done
+
+async def optimizer_events(req: TripRequest):
+    """/plan/stream for the "fast" and "narrate" planners: options come from the
+    optimizer, narrated ones as each narration finishes."""
+    options = mark_budget(await asyncio.to_thread(optimize_options, req), req)
+    yield ndjson({"type": "start", "options": len(options), "budget_limit": req.budget, "planner": req.planner})
+    if req.planner == "narrate":
+        tasks = [asyncio.create_task(narrate_option(o, req)) for o in options]
+        options = []
+        try:
+            for narrated in asyncio.as_completed(tasks):
+                option = await narrated
+                options.append(option)
+                yield ndjson({"type": "option", "option": option})
+        finally:
+            for t in tasks:
+                t.cancel()
+    else:
+        for option in options:
+            yield ndjson({"type": "option", "option": option})
+    yield ndjson(await plan_done_event(req, options))
+
+def ask_prompt_prefix(preferences: List[str], selected: Optional[dict], options: List[dict]) -> str:
+    """Instructions, preferences and the user's itineraries: unchanged between
+    turns about the same plan, so Ollama can reuse them."""
+    selected_text, options_text = compact_itineraries(selected, options, ASK_ITINERARY_TOKENS)
+    prefix = f"""
 You are Bharat Yatri, a knowledgeable Indian travel guide.
 
-{selected_context}
-{options_context}
-
-RELEVANT PLACE INFORMATION (use only these facts):
-{context}
-
-USER PREFERENCES: {", ".join(req.preferences) if req.preferences else "exploring India"}
-
-USER QUESTION: {req.question}
-
 INSTRUCTIONS:
 1. If the user asks about their generated options, compare and explain the differences.
 2. If the user selected an option, provide detailed insights about their chosen itinerary.
 3. Answer in 3-4 sentences maximum. Be conversational and helpful.
 4. If the question is in Hindi, reply in Hindi naturally.
 5. Add one practical tip, eco-friendly suggestion, or local insight.
-6. Never make up facts. Only use the information provided above.
+6. Never make up facts. Only use the information provided in this message.
 7. If you don't have information, say so.
 
+USER PREFERENCES: {", ".join(preferences) if preferences else "exploring India"}
+""".lstrip()
+    if selected_text:
+        prefix += f"\nUSER'S SELECTED ITINERARY:\n{selected_text}\n"
+    if options_text:
+        prefix += f"\nUSER'S GENERATED ITINERARY OPTIONS:\n{options_text}\n"
+    return prefix
+
+def open_session(req: AskRequest) -> ChatSession:
+    """The request's chat session, created if unknown or expired, and updated
+    with any plan state the request still carries."""
+    session = sessions.get(req.session_id)
+    if session is None:
+        session = sessions.create(req.preferences, req.chosen_options)
+    with session.lock:
+        if req.chosen_options:
+            session.set_options(req.chosen_options)
+        if req.preferences:
+            session.preferences = list(req.preferences)
+        if req.selected_option:
+            session.select(req.selected_option)
+        elif req.selected_option_number is not None:
+            session.selected = req.selected_option_number
+    return session
+
+def session_prefix(session: ChatSession) -> str:
+    key = session.plan_key()
+    if session.prefix_key != key:
+        session.prefix = ask_prompt_prefix(session.preferences, session.selected_option(), session.options)
+        session.prefix_key = key
+    return session.prefix
+
+def ask_places(session: ChatSession, question: str):
+    """Places for a chat turn; a follow-up close to the previous question reuses its retrieval.
+    A question that names no place is about the previous one, or else the itinerary's.
+    Returns (places, question embedding, reused)."""
+    location = places.locate(question)
+    embedding = embeddings.embed_query(question)
+    rows = session.cached_rows(embedding, location, SESSION_REUSE_THRESHOLD)
+    if rows is not None:
+        ASK_RETRIEVAL.inc(source="session")
+        return [p for p in (places.get(r) for r in rows) if p is not None], embedding, True
+    ASK_RETRIEVAL.inc(source="search")
+    if not location:
+        location = session.query_location or places.locate(session.itinerary_city() or "")
+    docs = retriever.search(
+        question, ASK_CONTEXT_K,
+        keywords=expand_preferences(session.preferences), **location
+    )
+    session.remember_retrieval(embedding, location, [p.row_id for p in docs])
+    return docs, embedding, False
+
+def build_ask_prompt(session: ChatSession, question: str) -> Tuple[str, str, List[float], bool]:
+    """(shared prefix, per-question suffix, question embedding, retrieval reused);
+    the full prompt is prefix + suffix."""
+    with span("retrieval"):
+        docs, embedding, reused = ask_places(session, question)
+    with span("context_build"):
+        prefix = session_prefix(session)
+        facts = compact_facts(docs, ASK_FACTS_TOKENS)
+        history = session.history(SESSION_HISTORY_TOKENS)
+
+    earlier = f"\nEARLIER IN THIS CONVERSATION:\n{history}\n" if history else ""
+    prompt = f"""{earlier}
+RELEVANT PLACE INFORMATION (use only these facts):
+{facts}
+
+USER QUESTION: {question}
+
 Answer:
-""".strip()
+""".rstrip()
+    return prefix, prompt, embedding, reused
+
+def lookup_ask_answer(session: ChatSession, prompt_text: str, embedding: List[float]):
+    """Check the exact tier, then the semantic tier; returns (key, namespace, answer)."""
+    namespace = make_key(
+        "ask", CHAT_MODEL,
+        normalize_preferences(session.preferences), session.options, session.selected
+    )
+    key = make_key(namespace, prompt_text)
+    answer = generation_cache.get(key)
+    if answer:
+        return key, namespace, answer
+    return key, namespace, generation_cache.get_similar(namespace, embedding)
+
+def finish_turn(session: ChatSession, question: str, answer: str):
+    with session.lock:
+        session.add_turn(question, answer, SESSION_HISTORY_TURNS)
+        sessions.save(session)
+
+def ask_context_used(session: ChatSession, reused: bool) -> dict:
+    return {
+        "has_options": bool(session.options),
+        "has_selection": session.selected is not None,
+        "preferences": session.preferences,
+        "reused_retrieval": reused
+    }
 
-    prompt = PromptTemplate.from_template(prompt_text)
-    chain = prompt | qwen_llm
+async def prepare_ask(req: AskRequest):
+    def prepare():
+        session = open_session(req)
+        with session.lock:
+            prefix, prompt, embedding, reused = build_ask_prompt(session, req.question)
+            with span("cache_lookup"):
+                key, namespace, cached = lookup_ask_answer(session, prefix + prompt, embedding)
+        return session, prefix, prompt, embedding, reused, key, namespace, cached
+    return await asyncio.to_thread(prepare)
+
+@app.post("/ask")
+async def chat(req: AskRequest):
+    print(f"Chat query: {req.question[:50]}...")
+    await require_rag()
     
-    try:
-        answer = chain.invoke({}).strip()
-        print(f"Chatbot response generated")
+    session, prefix, prompt, embedding, reused, key, namespace, cached = await prepare_ask(req)
+    if cached:
+        print("Chatbot response served from cache")
+        await asyncio.to_thread(finish_turn, session, req.question, cached)
         return {
-            "answer": answer,
-            "context_used": {
-                "has_options": bool(req.chosen_options),
-                "has_selection": bool(req.selected_option),
-                "preferences": req.preferences
-            }
+            "answer": cached,
+            "context_used": ask_context_used(session, reused),
+            "cached": True,
+            "session_id": session.session_id
         }
-    except Exception as e:
-        print(f"Chatbot error: {e}")
+
+    with span("generation"):
+        answer = (await llm.generate(prompt, model=CHAT_MODEL, temperature=0.3, fallback=False, prefix=prefix)).strip()
+    if answer:
+        await asyncio.to_thread(generation_cache.put, key, answer, namespace, embedding)
+        await asyncio.to_thread(finish_turn, session, req.question, answer)
+        print(f"Chatbot response generated")
         return {
-            "answer": "Sorry, I ran into an issue. Please try again.",
-            "error": str(e)
+            "answer": answer,
+            "context_used": ask_context_used(session, reused),
+            "session_id": session.session_id
         }
 
+    print(f"Chatbot error: no response from {CHAT_MODEL}")
+    return {
+        "answer": "Sorry, I ran into an issue. Please try again.",
+        "error": "LLM backend unavailable",
+        "session_id": session.session_id
+    }
+
+@app.post("/ask/stream")
+async def chat_stream(req: AskRequest):
+    print(f"Streaming chat query: {req.question[:50]}...")
+    await require_rag()
+
+    session, prefix, prompt, embedding, reused, key, namespace, cached = await prepare_ask(req)
+
+    async def events():
+        if cached:
+            await asyncio.to_thread(finish_turn, session, req.question, cached)
+            yield ndjson({"type": "token", "text": cached})
+            yield ndjson({"type": "done", "answer": cached, "context_used": ask_context_used(session, reused),
+                          "cached": True, "session_id": session.session_id})
+            return
+
+        answer = ""
+        async for token in llm.stream(prompt, model=CHAT_MODEL, temperature=0.3, fallback=False, prefix=prefix):
+            answer += token
+            yield ndjson({"type": "token", "text": token})
+        if not answer.strip():
+            yield ndjson({"type": "error", "error": "Sorry, I ran into an issue. Please try again."})
+        else:
+            await asyncio.to_thread(generation_cache.put, key, answer.strip(), namespace, embedding)
+            await asyncio.to_thread(finish_turn, session, req.question, answer.strip())
+        yield ndjson({"type": "done", "answer": answer.strip(), "context_used": ask_context_used(session, reused),
+                      "session_id": session.session_id})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 # Trips endpoints removed (MongoDB disabled)
 # trips endpoints removed
 
@@ -320,19 +761,66 @@ def home():
     return {
         "message": "Touristique API v2.0 - Running",
         "endpoints": {
-            "/plan": "POST - Generate 5 itinerary options",
+            "/plan": f"POST - Generate {PLAN_MIN_OPTIONS} itinerary options (first to parse of {PLAN_OPTIONS})",
             "/ask": "POST - Context-aware chatbot",
+            "/plan/stream": "POST - Stream itinerary days and options as NDJSON",
+            "/ask/stream": "POST - Stream chatbot tokens as NDJSON",
+            "/metrics": "GET - Prometheus metrics",
         },
         "status": "running"
     }
 
 @app.get("/health")
 def health():
-    return {
-        "status": "healthy",
+    """Readiness probe: 200 once the RAG index can serve requests, 503 before that."""
+    if rag_ready.is_set():
+        models_ready = all(components[m]["state"] == "ready" for m in ("planner_model", "chat_model"))
+        status = "healthy" if models_ready else "degraded"
+    elif any(c["state"] == "failed" for c in components.values()):
+        status = "failed"
+    else:
+        status = "starting"
+    body = {
+        "status": status,
+        "uptime_seconds": round(time.time() - started_at, 1),
+        "components": components,
         "models": {
-            "planner": "phi3:mini",
-            "chatbot": "qwen2.5:7b-instruct-q4_K_M"
+            "planner": PLANNER_MODEL,
+            "chatbot": CHAT_MODEL
         },
-        "rag_index": "loaded"
-    }
\ No newline at end of file
+        "llm_backends": llm.status(),
+        "rag_index": "loaded" if rag_ready.is_set() else components["vector_store"]["state"],
+        "generation_cache": generation_cache.stats(),
+        "sessions": sessions.stats(),
+        "embedding_batcher": embeddings.stats() if embeddings is not None else None
+    }
+    return JSONResponse(body, status_code=200 if rag_ready.is_set() else 503)
+
+def runtime_gauges() -> Dict[str, float]:
+    gauges = {
+        f"touristique_generation_cache_{name}": value
+        for name, value in generation_cache.stats().items()
+        if name in ("size", "hits", "semantic_hits", "misses", "evictions")
+    }
+    session_stats = sessions.stats()
+    gauges["touristique_sessions"] = session_stats["size"]
+    gauges["touristique_session_bytes"] = session_stats["bytes"]
+    gauges["touristique_session_evictions"] = session_stats["evictions"]
+    gauges["touristique_rag_ready"] = int(rag_ready.is_set())
+    for backend, state in llm.status().items():
+        gauges[f"touristique_llm_breaker_open{{backend=\"{backend}\"}}"] = int(state != "closed")
+    if embeddings is not None:
+        stats = embeddings.stats()
+        gauges["touristique_embedding_batches"] = stats["batches"]
+        gauges["touristique_embedding_avg_batch_size"] = stats["avg_batch_size"]
+        gauges["touristique_embedding_avg_queue_delay_ms"] = stats["avg_queue_delay_ms"]
+        gauges["touristique_embedding_max_queue_delay_ms"] = stats["max_queue_delay_ms"]
+        gauges["touristique_embedding_cache_hits"] = stats["cache_hits"]
+        gauges["touristique_embedding_cache_misses"] = stats["cache_misses"]
+    return gauges
+
+registry.gauge_collector(runtime_gauges)
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
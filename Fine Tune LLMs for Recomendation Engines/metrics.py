@@ -0,0 +1,184 @@
+# metrics.py
+import asyncio
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Per-request stage spans as (stage, start, end) perf_counter times, read back by
+# the HTTP middleware for the Server-Timing header.
+request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def _labels_text(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple[str, ...], List[float]] = {}  # bucket counts..., +Inf count, sum
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_labels_text(self.labels, key, le)} {cumulative:g}")
+                cumulative += series[len(self.buckets)]
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels_text(self.labels, key, le)} {cumulative:g}")
+                lines.append(f"{self.name}_sum{_labels_text(self.labels, key)} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{_labels_text(self.labels, key)} {cumulative:g}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge_collector(self, fn):
+        """Register fn() -> {metric_name: value}; sampled at scrape time. Names may carry a {label="..."} suffix."""
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        typed = set()
+        for fn in self.collectors:
+            try:
+                gauges = fn() or {}
+            except Exception:
+                continue
+            for name, value in gauges.items():
+                base = name.split("{", 1)[0]
+                if base not in typed:
+                    typed.add(base)
+                    lines.append(f"# TYPE {base} gauge")
+                lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "touristique_request_seconds", "HTTP request latency", ("path", "status"))
+STAGE_SECONDS = registry.histogram(
+    "touristique_stage_seconds", "Time spent in each pipeline stage (outcome: ok, error, cancelled)",
+    ("stage", "outcome"))
+LLM_SECONDS = registry.histogram(
+    "touristique_llm_seconds", "LLM call latency", ("backend", "model", "outcome"))
+LLM_TOKENS = registry.counter(
+    "touristique_llm_tokens_total", "Tokens reported by the LLM backends", ("backend", "model", "kind"))
+LLM_FALLBACKS = registry.counter(
+    "touristique_llm_fallbacks_total", "Calls routed to the fallback backend", ("reason",))
+LLM_RETRIES = registry.counter(
+    "touristique_llm_retries_total", "Retried LLM attempts", ("backend",))
+ASK_RETRIEVAL = registry.counter(
+    "touristique_ask_retrieval_total", "Chat retrievals by source (search, or reused from the session)", ("source",))
+
+
+def record_stage(stage: str, started: float, ended: float, outcome: str = "ok"):
+    STAGE_SECONDS.observe(ended - started, stage=stage, outcome=outcome)
+    timings = request_timings.get()
+    if timings is not None:
+        timings.append((stage, started, ended))
+
+
+@contextmanager
+def span(stage: str):
+    """Time a stage. A span cut short by cancellation (a dropped option, a
+    wait_for timeout, a client disconnect) is recorded as "cancelled"."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        record_stage(stage, started, time.perf_counter(), outcome)
+
+
+def _wall_seconds(intervals: List[Tuple[float, float]]) -> float:
+    """Length of the union of (start, end) intervals: concurrent spans count once."""
+    covered, reach = 0.0, float("-inf")
+    for start, end in sorted(intervals):
+        if end > reach:
+            covered += end - max(start, reach)
+            reach = end
+    return covered
+
+
+def server_timing(timings: List[Tuple[str, float, float]], total: float) -> str:
+    """Format stage spans for the Server-Timing response header (durations in ms).
+    A stage seen several times reports its wall-clock time, not the sum of overlapping spans."""
+    merged: Dict[str, List[Tuple[float, float]]] = {}
+    for stage, started, ended in timings:
+        merged.setdefault(stage, []).append((started, ended))
+    parts = []
+    for stage, intervals in merged.items():
+        dur = f"{stage};dur={1000 * _wall_seconds(intervals):.1f}"
+        parts.append(f'{dur};desc="x{len(intervals)}"' if len(intervals) > 1 else dur)
+    parts.append(f"total;dur={1000 * total:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,228 @@
+# optimizer.py
+import math
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from context_compactor import dedupe_places
+from places import Place
+from retrieval import PREFERENCE_TERMS, tokenize
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+SLOT_ORDER = {"morning": 0, "afternoon": 1, "evening": 2, "night": 3}
+
+# (label, cost per day) from most to least comfortable; the solver takes the
+# first one that leaves room for at least one entrance fee.
+STAY_TIERS = [("Eco Homestay", 2500), ("Budget Guesthouse", 1200), ("Dharamshala", 500)]
+FOOD_TIERS = [("Local thali & street food", 600), ("Street food", 300)]
+
+OUTDOOR = {"adventure", "nature", "wildlife", "scenic", "trekking", "sports", "natural wonder", "botanical", "environmental"}
+HERITAGE = {"historical", "architectural", "archaeological", "cultural", "artistic"}
+
+# Hours of a day lost to moving between cities. The table has no coordinates,
+# so a move is only allowed within a state; anything further does not fit a day.
+INTRA_STATE_TRAVEL_HOURS = 3.0
+# Score cost of a move, about half a good place (place scores run ~5-8), so the
+# plan only changes city when that buys a clearly better day.
+MOVE_PENALTY = 4.0
+
+# Score penalty per earlier option a place appeared in, then the heavier one
+# used to re-solve when a style still reproduces an earlier option.
+REUSE_PENALTY = 1.5
+RETRY_REUSE_PENALTY = 6.0
+
+# One entry per variation hint in main.plan_prompt_suffix, in the same order.
+STYLES = ["popular", "offbeat", "balanced", "adventure", "heritage"]
+
+
+class Schedule:
+    __slots__ = ("days", "used", "score")
+
+    def __init__(self, days: List[Tuple[str, List[Place]]], used: frozenset, score: float):
+        self.days = days
+        self.used = used
+        self.score = score
+
+
+def place_score(p: Place, style: str, preference_terms: set) -> float:
+    popularity = math.log1p(p.reviews_lakh * 100)
+    significance = p.significance.lower()
+    if style == "popular":
+        score = p.rating + 0.6 * popularity
+    elif style == "offbeat":
+        score = p.rating + 0.6 * (3 - popularity)
+    elif style == "adventure":
+        score = p.rating + (2.0 if significance in OUTDOOR else 0.0)
+    elif style == "heritage":
+        score = p.rating + (2.0 if significance in HERITAGE or p.type.lower() == "museum" else 0.0)
+    else:
+        score = p.rating + 0.3 * popularity
+    if preference_terms & set(tokenize(f"{p.type} {p.significance}")):
+        score += 1.5
+    return score
+
+
+def is_open(p: Place, day: date) -> bool:
+    return not p.weekly_off or p.weekly_off.lower() != WEEKDAYS[day.weekday()]
+
+
+def day_costs(max_per_day: float) -> Tuple[Tuple[str, int], Tuple[str, int]]:
+    for stay in STAY_TIERS:
+        for food in FOOD_TIERS:
+            if stay[1] + food[1] < max_per_day:
+                return stay, food
+    return STAY_TIERS[-1], FOOD_TIERS[-1]
+
+
+def travel_hours(origin: str, city: str, state_of: Dict[str, str]) -> Optional[float]:
+    """Hours to get from `origin` to `city` (lowercased names), or None if it is out of reach for one day."""
+    if origin == city:
+        return 0.0
+    if state_of.get(origin) and state_of.get(origin) == state_of.get(city):
+        return INTRA_STATE_TRAVEL_HOURS
+    return None
+
+
+def day_bundles(options: Sequence[Place], fee_room: float, hours: float, per_day: int) -> List[List[Place]]:
+    """All feasible sets of 1..per_day places that fit the fee room and the hours limit,
+    with at most one place per specific time slot."""
+    bundles = [[p] for p in options if p.fee <= fee_room and p.hours <= hours]
+    if per_day >= 2:
+        for i, a in enumerate(options):
+            for b in options[i + 1:]:
+                if a.fee + b.fee > fee_room or a.hours + b.hours > hours:
+                    continue
+                slot_a, slot_b = a.best_time.lower(), b.best_time.lower()
+                if slot_a in SLOT_ORDER and slot_a == slot_b:
+                    continue
+                bundles.append([a, b])
+    return bundles
+
+
+def solve(candidates: Sequence[Place], duration: int, budget: float, start_city: str = "",
+          style: str = "balanced", preferences: Sequence[str] = (), start_date: Optional[date] = None,
+          daily_hours: float = 8.0, per_day: int = 2, beam_width: int = 8,
+          reuse_penalty: Optional[Dict[int, float]] = None, start_state: str = "") -> Optional[Schedule]:
+    """Beam search over days. Each day picks a city and a bundle of places
+    whose entrance fees plus stay and food fit the per-day budget and whose
+    visit hours, plus the travel hours to reach that city, fit `daily_hours`.
+    Day 1 starts from `start_city` (or, if the table does not list it, from
+    `start_state`); each later day starts where the previous one ended.
+    Places closed on that weekday are skipped. Each place (by name) is used
+    at most once per schedule, and changing city also costs MOVE_PENALTY.
+    Returns None if no full schedule exists."""
+    duration = max(duration, 1)
+    max_per_day = budget / duration
+    (_, stay_cost), (_, food_cost) = day_costs(max_per_day)
+    fee_room = max_per_day - stay_cost - food_cost
+    start_date = start_date or date.today()
+    reuse_penalty = reuse_penalty or {}
+    terms = set(tokenize(" ".join(PREFERENCE_TERMS.get(p.lower(), p) for p in preferences)))
+
+    candidates = dedupe_places(candidates)
+    scores = {p.row_id: place_score(p, style, terms) - reuse_penalty.get(p.row_id, 0.0) for p in candidates}
+    by_city: Dict[str, List[Place]] = {}
+    state_of: Dict[str, str] = {}
+    for p in sorted(candidates, key=lambda p: scores[p.row_id], reverse=True):
+        by_city.setdefault(p.city, []).append(p)
+        state_of[p.city.lower()] = p.state.lower()
+
+    start = start_city.strip().lower()
+    if start not in state_of and start_state:
+        state_of[start] = start_state.strip().lower()
+    beam = [Schedule([], frozenset(), 0.0)]
+    for d in range(duration):
+        day = start_date + timedelta(days=d)
+        expanded = []
+        for state in beam:
+            origin = state.days[-1][0].lower() if state.days else start
+            for city, city_places in by_city.items():
+                if not origin or origin not in state_of:
+                    travel = 0.0  # unknown start: the trip may begin anywhere
+                else:
+                    travel = travel_hours(origin, city.lower(), state_of)
+                if travel is None or travel >= daily_hours:
+                    continue
+                open_places = [p for p in city_places if p.row_id not in state.used and is_open(p, day)][:12]
+                if not open_places:
+                    continue
+                move = -MOVE_PENALTY if travel else 0.0
+                for bundle in day_bundles(open_places, fee_room, daily_hours - travel, per_day):
+                    gain = sum(scores[p.row_id] for p in bundle) + move
+                    bundle = sorted(bundle, key=lambda p: SLOT_ORDER.get(p.best_time.lower(), 1))
+                    expanded.append(Schedule(
+                        state.days + [(city, bundle)],
+                        state.used | {p.row_id for p in bundle},
+                        state.score + gain,
+                    ))
+        if not expanded:
+            return None
+        expanded.sort(key=lambda s: s.score, reverse=True)
+        beam = expanded[:beam_width]
+    return beam[0]
+
+
+def schedule_signature(schedule: Schedule) -> frozenset:
+    """Two schedules visiting the same places are the same option, whatever the day order."""
+    return schedule.used
+
+
+def schedule_to_option(schedule: Schedule, budget: float, duration: int, option_number: int, style: str) -> dict:
+    (stay_name, stay_cost), (food_name, food_cost) = day_costs(budget / max(duration, 1))
+    itinerary, lines, total = [], [], 0
+    for i, (city, bundle) in enumerate(schedule.days, start=1):
+        cost = stay_cost + food_cost + sum(p.fee for p in bundle)
+        total += cost
+        names = [p.name for p in bundle]
+        itinerary.append({
+            "day": i,
+            "city": city,
+            "destinations": names,
+            "stay": f"{stay_name} - ₹{stay_cost}",
+            "food": f"{food_name} - ₹{food_cost}",
+            "cost": cost
+        })
+        lines.append(
+            f"Day {i}: {city} - {', '.join(names)}. Stay: {stay_name} - ₹{stay_cost:,}. "
+            f"Food: {food_name} - ₹{food_cost:,}. Cost: ₹{cost:,}"
+        )
+    return {
+        "option_number": option_number,
+        "itinerary": itinerary,
+        "total_cost": total,
+        "summary": f"{duration}-day trip for ₹{total:,}",
+        "raw_output": "\n".join(lines),
+        "style": style,
+        "source": "optimizer"
+    }
+
+
+def plan_options(candidates: Sequence[Place], duration: int, budget: float, start_city: str = "",
+                 preferences: Sequence[str] = (), start_date: Optional[date] = None,
+                 count: int = 5, **solver_kwargs) -> List[dict]:
+    """Up to `count` distinct schedules, one per style. Places used by earlier
+    options are penalised in later ones so the options differ. A style that
+    still reproduces an earlier option is re-solved with a heavier penalty,
+    then without the places already used; if it is still a copy it is
+    dropped, so fewer than `count` options may come back."""
+    candidates = dedupe_places(candidates)
+    options, uses, seen = [], {}, set()
+    for i in range(count):
+        style = STYLES[i % len(STYLES)]
+        attempts = (
+            (candidates, REUSE_PENALTY),
+            (candidates, RETRY_REUSE_PENALTY),
+            ([p for p in candidates if p.row_id not in uses], 0.0),
+        )
+        for pool, weight in attempts:
+            penalty = {row_id: weight * n for row_id, n in uses.items()}
+            schedule = solve(pool, duration, budget, start_city, style, preferences, start_date,
+                             reuse_penalty=penalty, **solver_kwargs)
+            if schedule is not None and schedule_signature(schedule) not in seen:
+                break
+        else:
+            continue
+        seen.add(schedule_signature(schedule))
+        for row_id in schedule.used:
+            uses[row_id] = uses.get(row_id, 0) + 1
+        options.append(schedule_to_option(schedule, budget, duration, len(options) + 1, style))
+    return options
@@ -0,0 +1,161 @@
+# places.py
+import csv
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+CSV_COLUMNS = {
+    "zone": "Zone",
+    "state": "State",
+    "city": "City",
+    "name": "Name",
+    "type": "Type",
+    "year": "Establishment Year",
+    "hours": "time needed to visit in hrs",
+    "rating": "Google review rating",
+    "fee": "Entrance Fee in INR",
+    "airport": "Airport with 50km Radius",
+    "weekly_off": "Weekly Off",
+    "significance": "Significance",
+    "dslr": "DSLR Allowed",
+    "reviews_lakh": "Number of google review in lakhs",
+    "best_time": "Best Time to visit",
+}
+
+INDEXED_FIELDS = ("city", "state", "zone", "type", "significance")
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def _float(value: str, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _key(value: str) -> str:
+    return " ".join(str(value or "").lower().split())
+
+
+class Place:
+    __slots__ = ("row_id",) + tuple(CSV_COLUMNS)
+
+    def __init__(self, row_id: int, row: Dict[str, str]):
+        self.row_id = row_id
+        for field, column in CSV_COLUMNS.items():
+            setattr(self, field, (row.get(column) or "").strip())
+        self.hours = _float(self.hours, 1.0)
+        self.rating = _float(self.rating)
+        self.fee = int(_float(self.fee))
+        self.reviews_lakh = _float(self.reviews_lakh)
+        if self.weekly_off.lower() in ("none", "no", ""):
+            self.weekly_off = ""
+
+    def summary(self) -> str:
+        parts = [self.significance or self.type, f"{self.hours:g}h visit", f"rated {self.rating:g}"]
+        if self.best_time and self.best_time.lower() not in ("all", "anytime"):
+            parts.append(f"best in the {self.best_time.lower()}")
+        if self.weekly_off:
+            parts.append(f"closed {self.weekly_off}")
+        return ", ".join(parts)
+
+    def context_line(self) -> str:
+        return f"- {self.name} ({self.city}): {self.type}, ₹{self.fee} — {self.summary()}"
+
+    def details(self) -> str:
+        return (
+            f"{self.name} ({self.city}, {self.state}): {self.type}, {self.significance}, est. {self.year}. "
+            f"Entry ₹{self.fee}. About {self.hours:g}h. Rated {self.rating:g} ({self.reviews_lakh:g} lakh reviews). "
+            f"Weekly off: {self.weekly_off or 'none'}. Best time: {self.best_time}. "
+            f"DSLR allowed: {self.dslr}. Airport within 50 km: {self.airport}."
+        )
+
+    def metadata(self) -> dict:
+        """Typed vector-store metadata; location/category strings are lower-cased for exact filters."""
+        return {
+            "row": self.row_id,
+            "name": self.name,
+            "city": _key(self.city),
+            "state": _key(self.state),
+            "zone": _key(self.zone),
+            "type": _key(self.type),
+            "significance": _key(self.significance),
+            "fee": self.fee,
+            "rating": self.rating,
+            "hours": self.hours,
+            "best_time": _key(self.best_time),
+        }
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class PlaceIndex:
+    """The places table, loaded once, with lookups by row id and by
+    City / State / Zone / Type / Significance (case-insensitive)."""
+
+    def __init__(self, places: List[Place]):
+        self.places = places
+        self.by_row = {p.row_id: p for p in places}
+        self.by_name = {_key(p.name): p for p in places}
+        self.indexes: Dict[str, Dict[str, List[int]]] = {f: defaultdict(list) for f in INDEXED_FIELDS}
+        for p in places:
+            for field in INDEXED_FIELDS:
+                self.indexes[field][_key(getattr(p, field))].append(p.row_id)
+
+    @classmethod
+    def load(cls, csv_path: str) -> "PlaceIndex":
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            # CSVLoader numbers rows from 0 in file order; keep the same ids.
+            places = [Place(i, row) for i, row in enumerate(csv.DictReader(f))]
+        return cls(places)
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def get(self, row_id: int) -> Optional[Place]:
+        return self.by_row.get(row_id)
+
+    def find(self, name: str) -> Optional[Place]:
+        return self.by_name.get(_key(name))
+
+    def for_doc(self, doc) -> Optional[Place]:
+        """Map a vector-store hit back to its row via the `row` metadata."""
+        row = (doc.metadata or {}).get("row")
+        return self.by_row.get(int(row)) if row is not None else None
+
+    def for_docs(self, docs: Iterable) -> List[Place]:
+        """Rows for a list of hits, in rank order, without duplicates (chunks of one row collapse)."""
+        seen, places = set(), []
+        for d in docs:
+            p = self.for_doc(d)
+            if p is not None and p.row_id not in seen:
+                seen.add(p.row_id)
+                places.append(p)
+        return places
+
+    def locate(self, text: str) -> Dict[str, str]:
+        """Resolve a start city, a state, or a question mentioning one into {city, state, zone}."""
+        needle = f" {' '.join(_TOKEN.findall(_key(text)))} "
+        for field in ("city", "state"):
+            for value, ids in self.indexes[field].items():
+                if value and f" {value} " in needle:
+                    p = self.by_row[ids[0]]
+                    location = {"state": p.state, "zone": p.zone}
+                    if field == "city":
+                        location["city"] = p.city
+                    return location
+        return {}
+
+    def filter(self, **criteria: str) -> List[Place]:
+        """Rows matching every given indexed field, e.g. filter(state="Delhi", type="Tomb")."""
+        ids = None
+        for field, value in criteria.items():
+            if value is None:
+                continue
+            matched = set(self.indexes[field].get(_key(value), ()))
+            ids = matched if ids is None else ids & matched
+        if ids is None:
+            return list(self.places)
+        return [self.by_row[i] for i in sorted(ids)]
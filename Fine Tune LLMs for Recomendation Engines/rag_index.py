@@ -1,27 +1,196 @@
+"""Incremental RAG index builder.
+
+One document per place row. Rows are keyed by a stable id derived from
+(State, City, Name) and fingerprinted by a hash of their content. Only new
+or changed rows are embedded, rows whose position moved only get their
+metadata updated, and rows that disappeared from the CSV are deleted. A
+manifest next to the index is rewritten after every committed batch so an
+interrupted run resumes where it stopped.
+
+Usage: python rag_index.py [--csv data/places.csv] [--batch-size 64] [--workers 1] [--rebuild]
+"""
+import argparse
+import csv
+import hashlib
+import json
 import os
-from langchain_community.document_loaders import CSVLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+
+from places import Place
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+MANIFEST_NAME = "manifest.json"
+
+
+def place_id(row: Dict[str, str], seen: Dict[str, int]) -> str:
+    identity = "|".join((row.get(c) or "").strip().lower() for c in ("State", "City", "Name"))
+    seen[identity] = seen.get(identity, 0) + 1
+    if seen[identity] > 1:
+        identity += f"|{seen[identity]}"
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()[:20]
+
+
+def row_text(row: Dict[str, str]) -> str:
+    return "\n".join(f"{k}: {(v or '').strip()}" for k, v in row.items() if k)
+
+
+def row_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def read_chunks(csv_path: str, chunk_size: int) -> Iterator[List[Tuple[str, int, str, dict]]]:
+    """Stream the CSV as chunks of (id, row number, text, metadata)."""
+    seen: Dict[str, int] = {}
+    chunk = []
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            chunk.append((place_id(row, seen), i, row_text(row), Place(i, row).metadata()))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def load_manifest(path: str) -> dict:
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"model": EMBEDDING_MODEL, "rows": {}}
+
+
+def save_manifest(path: str, manifest: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+# Process-pool embedding: each worker loads the encoder once.
+_worker_embeddings = None
+
+
+def _init_worker(model_name: str):
+    global _worker_embeddings
+    from langchain_huggingface import HuggingFaceEmbeddings
+    _worker_embeddings = HuggingFaceEmbeddings(model_name=model_name)
+
+
+def _embed_in_worker(texts: List[str]) -> List[List[float]]:
+    return _worker_embeddings.embed_documents(texts)
+
+
+class Embedder:
+    def __init__(self, workers: int, batch_size: int):
+        self.batch_size = batch_size
+        self.pool = None
+        self.embeddings = None
+        if workers > 1:
+            self.pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(EMBEDDING_MODEL,))
+        else:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            self.embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, encode_kwargs={"batch_size": batch_size})
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if self.pool is not None:
+            return [v for vectors in self.pool.map(_embed_in_worker, batches) for v in vectors]
+        return [v for batch in batches for v in self.embeddings.embed_documents(batch)]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def build_index(csv_path: str, persist_directory: str, batch_size: int, workers: int,
+                chunk_size: int, rebuild: bool):
+    from langchain_chroma import Chroma
+
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Could not find {csv_path}. Please add your places.csv file in the /data folder.")
+    os.makedirs(persist_directory, exist_ok=True)
+
+    manifest_path = os.path.join(persist_directory, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    collection = Chroma(persist_directory=persist_directory)._collection
+
+    if rebuild or not manifest["rows"] or manifest.get("model") != EMBEDDING_MODEL:
+        # No usable manifest (first run, old chunked index, or a new model): start clean.
+        existing = collection.get(include=[])["ids"]
+        for i in range(0, len(existing), 5000):
+            collection.delete(ids=existing[i:i + 5000])
+        manifest = {"model": EMBEDDING_MODEL, "rows": {}}
+        print(f"Cleared {len(existing)} existing documents")
+
+    rows = manifest["rows"]
+    embedder = None
+    seen_ids = set()
+    scanned = embedded = moved = 0
+    started = time.perf_counter()
+
+    for chunk in read_chunks(csv_path, chunk_size):
+        scanned += len(chunk)
+        changed, relocated = [], []
+        for doc_id, row_num, text, metadata in chunk:
+            seen_ids.add(doc_id)
+            digest = row_hash(text)
+            known = rows.get(doc_id)
+            if known is None or known["hash"] != digest:
+                changed.append((doc_id, row_num, text, metadata, digest))
+            elif known["row"] != row_num:
+                relocated.append((doc_id, row_num, metadata))
+
+        if changed:
+            if embedder is None:
+                embedder = Embedder(workers, batch_size)
+            vectors = embedder.embed([c[2] for c in changed])
+            collection.upsert(
+                ids=[c[0] for c in changed],
+                embeddings=vectors,
+                documents=[c[2] for c in changed],
+                metadatas=[c[3] for c in changed],
+            )
+            for doc_id, row_num, _, _, digest in changed:
+                rows[doc_id] = {"hash": digest, "row": row_num}
+            embedded += len(changed)
+
+        if relocated:
+            collection.update(ids=[r[0] for r in relocated], metadatas=[r[2] for r in relocated])
+            for doc_id, row_num, _ in relocated:
+                rows[doc_id]["row"] = row_num
+            moved += len(relocated)
 
-os.makedirs("data", exist_ok=True)
-os.makedirs("chroma_db", exist_ok=True)
+        if changed or relocated:
+            save_manifest(manifest_path, manifest)
+        print(f"  {scanned} rows scanned, {embedded} embedded, {moved} re-numbered")
 
-csv_path = "data/places.csv"
+    removed = [doc_id for doc_id in rows if doc_id not in seen_ids]
+    for i in range(0, len(removed), 5000):
+        collection.delete(ids=removed[i:i + 5000])
+    for doc_id in removed:
+        del rows[doc_id]
+    save_manifest(manifest_path, manifest)
 
-if not os.path.exists(csv_path):
-    raise FileNotFoundError(f"Could not find {csv_path}. Please add your places.csv file in the /data folder.")
+    if embedder is not None:
+        embedder.close()
 
-loader = CSVLoader(csv_path)
-docs = loader.load()
-print(f"Loaded {len(docs)} rows from {csv_path}")
+    elapsed = time.perf_counter() - started
+    print(f"RAG Index Built! {len(rows)} places indexed from {csv_path}.")
+    print(f"  new/changed: {embedded}, re-numbered: {moved}, deleted: {len(removed)}, unchanged: {scanned - embedded - moved}")
+    print(f"  {elapsed:.1f}s total, {scanned / elapsed:.0f} rows/sec scanned"
+          + (f", {embedded / elapsed:.0f} rows/sec embedded" if embedded else ""))
 
-splitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=50)
-chunks = splitter.split_documents(docs)
-print(f"Split into {len(chunks)} chunks")
 
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-db = Chroma.from_documents(chunks, embeddings, persist_directory="chroma_db")
-db.persist()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or refresh the places vector index")
+    parser.add_argument("--csv", default="data/places.csv")
+    parser.add_argument("--persist-directory", default="chroma_db")
+    parser.add_argument("--batch-size", type=int, default=64, help="texts per encoder call")
+    parser.add_argument("--workers", type=int, default=1, help="embedding processes (1 = in-process encoder)")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="CSV rows read per chunk")
+    parser.add_argument("--rebuild", action="store_true", help="drop the index and re-embed every row")
+    args = parser.parse_args()
 
-print("RAG Index Built! Places loaded.")
\ No newline at end of file
+    build_index(args.csv, args.persist_directory, args.batch_size, args.workers, args.chunk_size, args.rebuild)
@@ -0,0 +1,152 @@
+# retrieval.py
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from places import Place, PlaceIndex
+
+RRF_K = 60
+
+# Profile interests -> words that occur in the Significance / Type columns.
+PREFERENCE_TERMS = {
+    "heritage": "historical architectural archaeological cultural fort palace monument tomb museum",
+    "historical": "historical architectural archaeological fort palace monument tomb memorial",
+    "cultural": "cultural artistic museum market village",
+    "artistic": "artistic cultural museum sculpture carvings",
+    "spiritual": "religious spiritual temple monastery gurudwara church mosque shrine ghat",
+    "nature": "nature natural botanical environmental lake waterfall valley hill park",
+    "scenic": "scenic nature viewpoint valley lake beach hill sunrise",
+    "beach": "beach island recreational",
+    "wildlife": "wildlife national park sanctuary zoo bird",
+    "adventure": "adventure trekking sports ski peak cave",
+    "shopping": "shopping market mall commercial",
+    "food": "food market",
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(str(text or "").lower())
+
+
+def expand_preferences(preferences: Iterable[str]) -> str:
+    return " ".join(PREFERENCE_TERMS.get(p.strip().lower(), p) for p in preferences or [])
+
+
+class BM25Index:
+    """Okapi BM25 over each place's name, type, significance and location."""
+
+    def __init__(self, places: PlaceIndex, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.lengths: Dict[int, int] = {}
+        for p in places.places:
+            tokens = tokenize(f"{p.name} {p.type} {p.significance} {p.city} {p.state} {p.zone} {p.best_time}")
+            self.lengths[p.row_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                self.postings[term][p.row_id] = tf
+        self.avg_length = (sum(self.lengths.values()) / len(self.lengths)) if self.lengths else 1.0
+        n = len(self.lengths)
+        self.idf = {t: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5)) for t, docs in self.postings.items()}
+
+    def search(self, query: str, k: int, candidates: Optional[Set[int]] = None) -> List[int]:
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            for row_id, tf in self.postings.get(term, {}).items():
+                if candidates is not None and row_id not in candidates:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[row_id] / self.avg_length)
+                scores[row_id] += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+def chroma_filter(conditions: Dict[str, object]) -> Optional[dict]:
+    """Translate {"state": "delhi", "fee": 500} into a Chroma `where` clause."""
+    clauses = []
+    for field, value in conditions.items():
+        if value is None:
+            continue
+        op = "$lte" if field == "fee" else "$eq"
+        clauses.append({field: {op: value}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class HybridRetriever:
+    """Structured pre-filter, then BM25 + vector search fused with reciprocal-rank fusion.
+
+    Filters are applied from most to least specific location (city, state,
+    zone, then anywhere). The first level that yields at least `k`
+    candidates is used, so a sparse region widens instead of returning
+    nothing.
+    """
+
+    def __init__(self, db, places: PlaceIndex, fetch_factor: int = 3, embed=None):
+        self.db = db
+        self.places = places
+        self.embed = embed
+        self.bm25 = BM25Index(places)
+        self.fetch_factor = fetch_factor
+
+    def _candidates(self, location: Dict[str, str], max_fee: Optional[float]) -> Set[int]:
+        rows = self.places.filter(**location)
+        return {p.row_id for p in rows if max_fee is None or p.fee <= max_fee}
+
+    def _vector_ranks(self, query: str, k: int, where: Optional[dict], candidates: Set[int]) -> List[int]:
+        if not candidates:
+            return []
+        if self.embed is None:
+            search = lambda **kwargs: self.db.similarity_search(query, **kwargs)
+        else:
+            vector = self.embed(query)
+            search = lambda **kwargs: self.db.similarity_search_by_vector(vector, **kwargs)
+        try:
+            docs = search(k=k, filter=where) if where else search(k=k)
+        except Exception as e:
+            print(f"Filtered vector search failed ({e}), retrying unfiltered")
+            docs = []
+        if where and not docs:
+            # An index built before rag_index.py wrote typed metadata matches no
+            # filter at all (Chroma returns nothing rather than raising). Search
+            # wider without it; the hits are narrowed to `candidates` below.
+            docs = search(k=k * 3)
+        return [p.row_id for p in self.places.for_docs(docs) if p.row_id in candidates]
+
+    def search(self, query: str, k: int = 10, keywords: str = "", city: Optional[str] = None,
+               state: Optional[str] = None, zone: Optional[str] = None,
+               max_fee: Optional[float] = None) -> List[Place]:
+        """Top-k places for `query`; `keywords` are extra terms for the lexical ranker only."""
+        levels = [
+            {"city": city, "state": state, "zone": zone},
+            {"state": state, "zone": zone},
+            {"zone": zone},
+            {},
+        ]
+        location, candidates = {}, set()
+        for level in levels:
+            level = {f: v.lower() for f, v in level.items() if v}
+            if location and level == location:
+                continue
+            location, candidates = level, self._candidates(level, max_fee)
+            if len(candidates) >= k:
+                break
+
+        fetch_k = k * self.fetch_factor
+        where = chroma_filter({**location, "fee": int(max_fee) if max_fee is not None else None})
+        vector = self._vector_ranks(query, fetch_k, where, candidates)
+        lexical = self.bm25.search(f"{query} {keywords}", fetch_k, candidates)
+
+        fused: Dict[int, float] = defaultdict(float)
+        for ranking in (vector, lexical):
+            for rank, row_id in enumerate(ranking):
+                fused[row_id] += 1.0 / (RRF_K + rank + 1)
+        best = sorted(fused, key=fused.get, reverse=True)[:k]
+        if len(best) < k:
+            # Neither ranker matched enough rows; top up with the best-rated candidates.
+            rest = sorted(candidates - set(best), key=lambda i: self.places.get(i).rating, reverse=True)
+            best += rest[:k - len(best)]
+        return [self.places.get(row_id) for row_id in best]
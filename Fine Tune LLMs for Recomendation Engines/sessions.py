@@ -0,0 +1,294 @@
+# sessions.py
+import json
+import math
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from context_compactor import TokenBudget
+from llm_cache import make_key
+
+SESSION_FIELDS = ("session_id", "preferences", "options", "selected", "prefix_key", "prefix",
+                  "query_embedding", "query_location", "doc_rows", "turns", "summary", "expires_at")
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+class ChatSession:
+    """Server-side state for one /ask conversation.
+
+    Holds the /plan options (without raw LLM output), the selected option
+    number, the rendered prompt prefix and the key it was rendered for, the
+    last retrieval (query embedding, location and place rows), the most
+    recent turns verbatim and a one-line summary of older ones.
+
+    Requests for the same session can run on several worker threads at once;
+    hold `lock` while reading or changing its state.
+    """
+
+    __slots__ = SESSION_FIELDS + ("size", "lock")
+
+    def __init__(self, session_id: str, preferences: Optional[List[str]] = None,
+                 options: Optional[List[dict]] = None, expires_at: float = 0.0):
+        self.session_id = session_id
+        self.preferences = list(preferences or [])
+        self.options: List[dict] = []
+        self.selected: Optional[int] = None
+        self.prefix_key = ""
+        self.prefix = ""
+        self.query_embedding: Optional[List[float]] = None
+        self.query_location: Dict[str, str] = {}
+        self.doc_rows: List[int] = []
+        self.turns: List[Dict[str, str]] = []
+        self.summary = ""
+        self.expires_at = expires_at
+        self.size = 0
+        self.lock = threading.RLock()
+        self.set_options(options or [])
+
+    # Plan state
+    def set_options(self, options: List[dict]):
+        self.options = [{k: v for k, v in o.items() if k not in ("raw_output", "diagnostics")} for o in options]
+        if self.selected is not None and self.selected_option() is None:
+            self.selected = None
+
+    def select(self, option: dict):
+        number = option.get("option_number")
+        if not any(o.get("option_number") == number for o in self.options):
+            self.options.append({k: v for k, v in option.items() if k not in ("raw_output", "diagnostics")})
+        self.selected = number
+
+    def selected_option(self) -> Optional[dict]:
+        if self.selected is None:
+            return None
+        return next((o for o in self.options if o.get("option_number") == self.selected), None)
+
+    def itinerary_city(self) -> Optional[str]:
+        """First city of the selected option (or of the first option), if any."""
+        option = self.selected_option() or (self.options[0] if self.options else None)
+        days = (option or {}).get("itinerary") or []
+        return days[0].get("city") if days else None
+
+    def plan_key(self) -> str:
+        """Changes whenever anything rendered into the prompt prefix changes."""
+        return make_key(self.preferences, self.options, self.selected)
+
+    # Retrieval reuse
+    def cached_rows(self, embedding: List[float], location: Dict[str, str], threshold: float) -> Optional[List[int]]:
+        """Rows from the previous retrieval if this question is close to the last one and
+        names the same place, or no place at all (a follow-up about the same one)."""
+        if not self.doc_rows or self.query_embedding is None:
+            return None
+        if location and location != self.query_location:
+            return None
+        return self.doc_rows if _cosine(embedding, self.query_embedding) >= threshold else None
+
+    def remember_retrieval(self, embedding: List[float], location: Dict[str, str], rows: List[int]):
+        self.query_embedding = list(embedding)
+        self.query_location = dict(location)
+        self.doc_rows = list(rows)
+
+    # Conversation history
+    def add_turn(self, question: str, answer: str, keep: int):
+        self.turns.append({"q": _clip(question, 300), "a": _clip(answer, 600)})
+        while len(self.turns) > keep:
+            old = self.turns.pop(0)
+            topics = [t for t in self.summary.split("; ") if t] + [_clip(old["q"], 60)]
+            self.summary = "; ".join(topics[-8:])
+
+    def history(self, limit: int) -> str:
+        """Recent turns, newest kept first when over `limit` tokens, rendered oldest to newest."""
+        budget = TokenBudget(limit)
+        lines = []
+        for turn in reversed(self.turns):
+            line = f"User: {turn['q']}\nGuide: {turn['a']}"
+            if not budget.take(line):
+                break
+            lines.append(line)
+        lines.reverse()
+        if self.summary and budget.take(self.summary):
+            lines.insert(0, f"(Earlier the user asked about: {self.summary})")
+        return "\n".join(lines)
+
+    # Serialisation
+    def to_json(self) -> str:
+        return json.dumps({f: getattr(self, f) for f in SESSION_FIELDS}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "ChatSession":
+        data = json.loads(raw)
+        session = cls(data["session_id"])
+        for field in SESSION_FIELDS:
+            if field in data:
+                setattr(session, field, data[field])
+        session.size = len(raw.encode("utf-8"))
+        return session
+
+
+class SessionStore:
+    """Chat sessions keyed by an opaque id.
+
+    Sessions live in an LRU bounded by `max_sessions` and by `max_bytes` of
+    serialised state, and expire `ttl` seconds after their last use. When
+    `db_path` is set, every save is written through to SQLite and sessions
+    missing from memory (evicted, or created by another worker before a
+    restart) are loaded back on demand.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 21600, max_bytes: int = 64 * 1024 * 1024,
+                 db_path: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.created = 0
+        self.hits = 0
+        self.misses = 0
+        self.loaded = 0
+        self.evictions = 0
+        self.expired = 0
+        self._db = None
+        if db_path:
+            self._open_db(db_path)
+
+    # Persistence
+    def _open_db(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT, expires_at REAL)")
+        self._db.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+        self._db.commit()
+
+    def _db_load(self, session_id: str) -> Optional[ChatSession]:
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute("SELECT state, expires_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return ChatSession.from_json(row[0])
+
+    def _db_put(self, session: ChatSession, raw: str):
+        if self._db is None:
+            return
+        with self._db_lock:
+            self._db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                             (session.session_id, raw, session.expires_at))
+            self._db.commit()
+
+    def _db_delete(self, session_id: str):
+        if self._db is None:
+            return
+        with self._db_lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._db.commit()
+
+    # In-memory LRU
+    def _insert(self, session: ChatSession):
+        old = self._sessions.pop(session.session_id, None)
+        if old is not None:
+            self._bytes -= old.size
+        self._sessions[session.session_id] = session
+        self._bytes += session.size
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            evicted_id, evicted = self._sessions.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+            if evicted_id == session.session_id:
+                break
+
+    def _remove(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._bytes -= session.size
+
+    # Public API
+    def create(self, preferences: Optional[List[str]] = None, options: Optional[List[dict]] = None) -> ChatSession:
+        session = ChatSession(secrets.token_urlsafe(16), preferences, options)
+        with self._lock:
+            self.created += 1
+        self.save(session)
+        return session
+
+    def get(self, session_id: Optional[str]) -> Optional[ChatSession]:
+        if not session_id:
+            return None
+        # SQLite reads and writes happen outside _lock so one slow commit
+        # doesn't stall lookups for every other session.
+        with self._lock:
+            session = self._sessions.get(session_id)
+            expired = session is not None and session.expires_at < time.time()
+            if expired:
+                self._remove(session_id)
+                self.expired += 1
+                session = None
+            elif session is not None:
+                self._sessions.move_to_end(session_id)
+                self.hits += 1
+                return session
+        if expired:
+            self._db_delete(session_id)
+            loaded = None
+        else:
+            loaded = self._db_load(session_id)
+        with self._lock:
+            # Another thread may have loaded or created it meanwhile; keep that copy.
+            session = self._sessions.get(session_id)
+            if session is None and loaded is not None:
+                session = loaded
+                self._insert(session)
+                self.loaded += 1
+            if session is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return session
+
+    def save(self, session: ChatSession):
+        """Refresh the session's TTL and store it (and write it through to SQLite).
+        Holding the session's lock keeps concurrent saves of one session in order."""
+        with session.lock:
+            session.expires_at = time.time() + self.ttl
+            raw = session.to_json()
+            session.size = len(raw.encode("utf-8"))
+            with self._lock:
+                self._insert(session)
+            self._db_put(session, raw)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._remove(session_id)
+        self._db_delete(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._sessions),
+            "bytes": self._bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "created": self.created,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loaded_from_disk": self.loaded,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "persistent": self._db is not None,
+        }
@@ -0,0 +1,174 @@
+# stub_llm.py
+# Local stand-in for Ollama (/api/generate) and xAI (/v1/chat/completions).
+# Usage: python stub_llm.py --port 11435 --token-delay 0.01 --prompt-token-delay 0.0005 --fail-rate 0.2
+#
+# Ollama's prompt cache is modelled per model over the last few prompts: the
+# leading words shared with one of them are not charged prefill again.
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ITINERARY = (
+    "Day {day}: Delhi - India Gate, Humayun's Tomb. Stay: Eco Homestay - ₹2,500. "
+    "Food: Chole Bhature - ₹400. Cost: ₹{cost:,}"
+)
+CACHE_SLOTS = 4
+CANNED_ANSWER = "Humayun's Tomb is a must-see in Delhi. Go in the afternoon and carry water; the gardens are large."
+
+
+def canned_response(prompt: str) -> str:
+    if "itinerary" in prompt.lower() and "Day 1:" in prompt:
+        days = 2
+        for line in prompt.splitlines():
+            if line.strip().startswith("- Duration:"):
+                days = int("".join(ch for ch in line if ch.isdigit()) or 2)
+        return "\n".join(CANNED_ITINERARY.format(day=d, cost=2900 + 100 * d) for d in range(1, days + 1))
+    return CANNED_ANSWER
+
+
+class StubConfig:
+    def __init__(self, token_delay: float = 0.0, first_token_delay: float = 0.0,
+                 fail_rate: float = 0.0, status: int = 500, prompt_token_delay: float = 0.0):
+        self.token_delay = token_delay
+        self.prompt_token_delay = prompt_token_delay
+        self.first_token_delay = first_token_delay
+        self.fail_rate = fail_rate
+        self.fail_next = 0  # fail exactly this many upcoming requests, then serve normally
+        self.status = status
+        self.requests = {"generate": 0, "chat": 0, "failed": 0}
+        self.prompt_cache = defaultdict(lambda: deque(maxlen=CACHE_SLOTS))
+        self.lock = threading.Lock()
+
+    def evaluate(self, model: str, prompt: str) -> int:
+        """Prompt words that miss the cached prefixes for `model`; the prompt is then cached."""
+        words = prompt.split()
+        with self.lock:
+            slots = self.prompt_cache[model]
+            shared = 0
+            for cached in slots:
+                n = 0
+                for a, b in zip(cached, words):
+                    if a != b:
+                        break
+                    n += 1
+                shared = max(shared, n)
+            slots.append(words)
+        return len(words) - shared
+
+
+def make_handler(config: StubConfig, response_fn=canned_response):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status: int, body: dict):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _should_fail(self) -> bool:
+            with config.lock:
+                forced = config.fail_next > 0
+                if forced:
+                    config.fail_next -= 1
+            if forced or (config.fail_rate and random.random() < config.fail_rate):
+                with config.lock:
+                    config.requests["failed"] += 1
+                self._json(config.status, {"error": "stub failure"})
+                return True
+            return False
+
+        def do_POST(self):
+            try:
+                self._post()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client gave up on this call (cancelled option, timeout)
+
+        def _post(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/api/generate":
+                with config.lock:
+                    config.requests["generate"] += 1
+                if self._should_fail():
+                    return
+                self._generate(body)
+            elif self.path == "/v1/chat/completions":
+                with config.lock:
+                    config.requests["chat"] += 1
+                if self._should_fail():
+                    return
+                prompt = body["messages"][-1]["content"]
+                text = response_fn(prompt)
+                time.sleep(config.first_token_delay + config.token_delay * len(text.split()))
+                self._json(200, {
+                    "choices": [{"message": {"role": "assistant", "content": text}}],
+                    "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(text.split())}
+                })
+            else:
+                self._json(404, {"error": "not found"})
+
+        def _generate(self, body: dict):
+            prompt = body.get("prompt", "")
+            text = response_fn(prompt)
+            tokens = text.split(" ")
+            evaluated = config.evaluate(body.get("model", ""), prompt)
+            counts = {"prompt_eval_count": evaluated, "eval_count": len(tokens)}
+            time.sleep(config.first_token_delay + config.prompt_token_delay * evaluated)
+            if not body.get("stream", True):
+                time.sleep(config.token_delay * len(tokens))
+                self._json(200, {"model": body.get("model"), "response": text, "done": True, **counts})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, token in enumerate(tokens):
+                piece = token if i == 0 else " " + token
+                self._chunk({"model": body.get("model"), "response": piece, "done": False})
+                time.sleep(config.token_delay)
+            self._chunk({"model": body.get("model"), "response": "", "done": True, **counts})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _chunk(self, obj: dict):
+            data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_stub(port: int = 0, config: StubConfig = None, response_fn=canned_response):
+    """Start the stub in a daemon thread; returns (server, base_url)."""
+    config = config or StubConfig()
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config, response_fn))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Ollama/xAI server")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    parser.add_argument("--prompt-token-delay", type=float, default=0.0, help="prefill seconds per uncached prompt word")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server, url = start_stub(args.port, StubConfig(args.token_delay, args.first_token_delay, args.fail_rate,
+                                                   prompt_token_delay=args.prompt_token_delay))
+    print(f"Stub LLM server on {url} (Ollama: {url}/api/generate, xAI: {url}/v1/chat/completions)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,178 @@
+# test_llm_client.py
+# LLMClient against the local stub server: retry, circuit breaking and fallback.
+# Run with `python -m pytest test_llm_client.py` or `python test_llm_client.py`.
+import asyncio
+import time
+
+from llm_client import LLMClient
+from metrics import LLM_FALLBACKS
+from stub_llm import CANNED_ANSWER, StubConfig, start_stub
+
+PROMPT = "What should I see in Delhi?"
+
+
+def make_client(ollama_config: StubConfig, xai_config: StubConfig = None, **kwargs):
+    _, ollama_url = start_stub(0, ollama_config)
+    xai_url = ""
+    if xai_config is not None:
+        _, xai_url = start_stub(0, xai_config)
+    kwargs.setdefault("backoff_base", 0.01)
+    kwargs.setdefault("latency_budget", 10.0)
+    return LLMClient(f"{ollama_url}/api/generate", f"{xai_url}/v1/chat/completions",
+                     xai_key="test" if xai_config is not None else None, **kwargs)
+
+
+def test_retry_recovers_from_transient_error():
+    ollama = StubConfig()
+    ollama.fail_next = 1
+    client = make_client(ollama)
+
+    async def run():
+        try:
+            return await client.generate(PROMPT)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == CANNED_ANSWER
+    assert ollama.requests == {"generate": 2, "chat": 0, "failed": 1}
+    assert client.status()["ollama"] == "closed"
+
+
+def test_breaker_opens_and_routes_to_fallback():
+    ollama, xai = StubConfig(fail_rate=1.0), StubConfig()
+    client = make_client(ollama, xai, max_retries=0, breaker_threshold=2, breaker_reset=60)
+
+    async def run():
+        try:
+            return [await client.generate(PROMPT) for _ in range(4)]
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == [CANNED_ANSWER] * 4
+    # Two failures open the circuit; the last two calls go straight to xAI.
+    assert ollama.requests["generate"] == 2
+    assert xai.requests["chat"] == 4
+    assert client.status()["ollama"] == "open"
+
+
+def test_half_open_probe_closes_circuit():
+    ollama = StubConfig(fail_rate=1.0)
+    client = make_client(ollama, max_retries=0, breaker_threshold=1, breaker_reset=0.1)
+
+    async def run():
+        try:
+            assert await client.generate(PROMPT) == ""
+            assert client.status()["ollama"] == "open"
+            assert await client.generate(PROMPT) == ""  # rejected without a request
+            await asyncio.sleep(0.15)
+            assert client.status()["ollama"] == "half_open"
+            ollama.fail_rate = 0.0
+            return await client.generate(PROMPT)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == CANNED_ANSWER
+    assert ollama.requests["generate"] == 2
+    assert client.status()["ollama"] == "closed"
+
+
+def test_failed_probe_reopens_circuit():
+    ollama = StubConfig(fail_rate=1.0)
+    client = make_client(ollama, max_retries=0, breaker_threshold=1, breaker_reset=0.1)
+
+    async def run():
+        try:
+            await client.generate(PROMPT)
+            await asyncio.sleep(0.15)
+            await client.generate(PROMPT)
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+    assert ollama.requests["generate"] == 2
+    assert client.status()["ollama"] == "open"
+
+
+def test_probe_without_slot_is_released():
+    ollama = StubConfig(fail_rate=1.0)
+    client = make_client(ollama, max_retries=0, breaker_threshold=1, breaker_reset=0.1, ollama_concurrency=1)
+
+    async def run():
+        try:
+            await client.generate(PROMPT)
+            await asyncio.sleep(0.15)
+            ollama.fail_rate = 0.0
+            await client.ollama.semaphore.acquire()  # saturate the primary
+            assert await client.generate(PROMPT, budget=0.05) == ""
+            client.ollama.semaphore.release()
+            return await client.generate(PROMPT)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == CANNED_ANSWER
+    assert client.status()["ollama"] == "closed"
+
+
+def test_saturated_fallback_reason():
+    ollama, xai = StubConfig(), StubConfig()
+    client = make_client(ollama, xai, ollama_concurrency=1)
+    before = {reason: LLM_FALLBACKS.values.get((reason,), 0) for reason in ("saturated", "budget_exhausted")}
+
+    async def run():
+        try:
+            await client.ollama.semaphore.acquire()  # saturate the primary
+            answer = await client.generate(PROMPT, budget=0.2)
+            client.ollama.semaphore.release()
+            return answer
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == CANNED_ANSWER
+    assert LLM_FALLBACKS.values.get(("saturated",), 0) == before["saturated"] + 1
+    assert LLM_FALLBACKS.values.get(("budget_exhausted",), 0) == before["budget_exhausted"]
+
+
+def test_cancelled_probe_is_released():
+    ollama = StubConfig(fail_rate=1.0)
+    client = make_client(ollama, max_retries=0, breaker_threshold=1, breaker_reset=0.1)
+
+    async def run():
+        try:
+            await client.generate(PROMPT)
+            await asyncio.sleep(0.15)
+            ollama.fail_rate = 0.0
+            ollama.first_token_delay = 0.5
+            probe = asyncio.create_task(client.generate(PROMPT))
+            await asyncio.sleep(0.05)
+            probe.cancel()
+            await asyncio.gather(probe, return_exceptions=True)
+            ollama.first_token_delay = 0.0
+            return await client.generate(PROMPT)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == CANNED_ANSWER
+    assert client.status()["ollama"] == "closed"
+
+
+def test_stream_falls_back_when_breaker_open():
+    ollama, xai = StubConfig(fail_rate=1.0), StubConfig()
+    client = make_client(ollama, xai, max_retries=0, breaker_threshold=1, breaker_reset=60)
+
+    async def run():
+        try:
+            await client.generate(PROMPT)
+            return [piece async for piece in client.stream(PROMPT)]
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == [CANNED_ANSWER]
+    assert ollama.requests["generate"] == 1
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            started = time.perf_counter()
+            test()
+            print(f"{name}: ok ({time.perf_counter() - started:.2f}s)")
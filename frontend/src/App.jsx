@@ -8,7 +8,7 @@ import { Login } from './pages/Login'
 import { Signup } from './pages/Signup'
 import { UserProfile } from './pages/UserProfile'
 import { useMemo } from 'react'
-import { buildPlanRequestFromProfile, planTrip, askQuestion } from './api'
+import { buildPlanRequestFromProfile, planTripStream, askQuestionStream } from './api'
 import { PersonalizedCards } from './components/PersonalizedCards'
 import { signOut } from './auth'
 import t1 from './pics/t1.jpg'
@@ -75,12 +75,14 @@ function App() {
     setChatMessages((prev)=>[...prev, { role: 'user', text: q }])
     setChatInput('')
     setChatLoading(true)
+    setChatMessages((prev)=>[...prev, { role: 'ai', text: '' }])
+    const setAiText = (text) => setChatMessages((prev)=>[...prev.slice(0, -1), { role: 'ai', text }])
     try {
-      const res = await askQuestion(q, userId)
+      const res = await askQuestionStream(q, userId, (_, soFar) => setAiText(soFar))
       const answer = String(res?.answer || '').trim() || 'No answer'
-      setChatMessages((prev)=>[...prev, { role: 'ai', text: answer }])
+      setAiText(answer)
     } catch {
-      setChatMessages((prev)=>[...prev, { role: 'ai', text: 'Sorry, something went wrong.' }])
+      setAiText('Sorry, something went wrong.')
     } finally {
       setChatLoading(false)
     }
@@ -89,96 +91,71 @@ function App() {
   
 
   const userId = useMemo(() => authUser?.id || null, [authUser])
-  useEffect(() => {
-    if (!userId) { setCards([]); return }
-    const fetchItinerary = async () => {
-      setCardsLoading(true)
-      try {
-        const payload = buildPlanRequestFromProfile(userId)
-        const data = await planTrip(payload)
-        const toDayItems = (arr) => (Array.isArray(arr) ? arr.map((d) => ({
-          day: d.day,
-          place: (Array.isArray(d.destinations) && d.destinations.length ? d.destinations[0] : (d.city || '')),
-          cost: Number(d.cost) || 0,
-        })) : [])
-        const expectedDays = Number(payload?.duration) || 0
-        const multi = data?.itineraries || data?.options || data?.plans
-        if (Array.isArray(multi) && multi.length) {
-          const built = multi.map((it) => {
-            let days = toDayItems(it.itinerary || it.days || [])
-            if (expectedDays > 0 && days.length > expectedDays) {
-              days = days.slice(0, expectedDays)
-            }
-            const start = days.length ? (days[0].place || '') : ''
-            const end = days.length ? (days[days.length - 1].place || '') : ''
-            const total = days.reduce((s, d) => s + (Number(d.cost) || 0), 0)
-            return { days, start, end, total }
-          }).filter(p => expectedDays ? p.days.length === expectedDays : true)
-          setPlans(built)
-          setSelectedPlanIdx(0)
-          const first = built[0] || { days: [], total: 0 }
-          setCards(first.days)
-          setTotalCost(first.total || 0)
-        } else {
-          const items = toDayItems(data?.itinerary)
-          const normalized = expectedDays > 0 ? items.slice(0, expectedDays) : items
-          const total = normalized.reduce((s, d) => s + (Number(d.cost) || 0), 0)
-          setPlans([{ days: normalized, start: normalized[0]?.place || '', end: normalized[normalized.length-1]?.place || '', total }])
-          setSelectedPlanIdx(0)
-          setCards(normalized)
-          setTotalCost(total)
-        }
-      } catch {
-        setCards([])
-      } finally {
-        setCardsLoading(false)
+  // Streams /plan: the first itinerary's days fill the cards as they are parsed,
+  // and the plans bar grows as each full option arrives.
+  const loadPlans = async (uid) => {
+    const payload = buildPlanRequestFromProfile(uid)
+    const expectedDays = Number(payload?.duration) || 0
+    const toDayItems = (arr) => (Array.isArray(arr) ? arr.map((d) => ({
+      day: d.day,
+      place: (Array.isArray(d.destinations) && d.destinations.length ? d.destinations[0] : (d.city || '')),
+      cost: Number(d.cost) || 0,
+    })) : [])
+    const sumCost = (days) => days.reduce((s, d) => s + (Number(d.cost) || 0), 0)
+    const buildPlans = (options) => options.map((it) => {
+      let days = toDayItems(it.itinerary || it.days || [])
+      if (expectedDays > 0 && days.length > expectedDays) {
+        days = days.slice(0, expectedDays)
       }
+      const start = days.length ? (days[0].place || '') : ''
+      const end = days.length ? (days[days.length - 1].place || '') : ''
+      return { days, start, end, total: sumCost(days) }
+    }).filter(p => expectedDays ? p.days.length === expectedDays : true)
+    const showPlans = (built) => {
+      setPlans(built)
+      setSelectedPlanIdx(0)
+      const first = built[0] || { days: [], total: 0 }
+      setCards(first.days)
+      setTotalCost(first.total || 0)
     }
-    fetchItinerary()
+
+    setCardsLoading(true)
+    setCards([])
+    setPlans([])
+    const received = []
+    const partialDays = []
+    let previewOption = null
+    try {
+      const data = await planTripStream(payload, uid, (event) => {
+        if (event.type === 'day' && !received.length) {
+          previewOption = previewOption ?? event.option_number
+          if (event.option_number !== previewOption) return
+          partialDays.push(event.day)
+          const items = toDayItems(partialDays)
+          setCards(items)
+          setTotalCost(sumCost(items))
+        } else if (event.type === 'option') {
+          received.push(event.option)
+          showPlans(buildPlans(received))
+        }
+      })
+      showPlans(buildPlans(data?.options || []))
+    } catch {
+      setCards([])
+    } finally {
+      setCardsLoading(false)
+    }
+  }
+
+  useEffect(() => {
+    if (!userId) { setCards([]); return }
+    loadPlans(userId)
   }, [userId])
 
   useEffect(() => {
     const onProfileUpdated = () => {
       if (!userId) return
-      const payload = buildPlanRequestFromProfile(userId)
-      setCardsLoading(true)
-      planTrip(payload)
-        .then((data) => {
-          const toDayItems = (arr) => (Array.isArray(arr) ? arr.map((d) => ({
-            day: d.day,
-            place: (Array.isArray(d.destinations) && d.destinations.length ? d.destinations[0] : (d.city || '')),
-            cost: Number(d.cost) || 0,
-          })) : [])
-          const expectedDays = Number(payload?.duration) || 0
-          const multi = data?.itineraries || data?.options || data?.plans
-          if (Array.isArray(multi) && multi.length) {
-            const built = multi.map((it) => {
-              let days = toDayItems(it.itinerary || it.days || [])
-              if (expectedDays > 0 && days.length > expectedDays) {
-                days = days.slice(0, expectedDays)
-              }
-              const start = days.length ? (days[0].place || '') : ''
-              const end = days.length ? (days[days.length - 1].place || '') : ''
-              const total = days.reduce((s, d) => s + (Number(d.cost) || 0), 0)
-              return { days, start, end, total }
-            }).filter(p => expectedDays ? p.days.length === expectedDays : true)
-            setPlans(built)
-            setSelectedPlanIdx(0)
-            const first = built[0] || { days: [], total: 0 }
-            setCards(first.days)
-            setTotalCost(first.total || 0)
-          } else {
-            const items = toDayItems(data?.itinerary)
-            const normalized = expectedDays > 0 ? items.slice(0, expectedDays) : items
-            const total = normalized.reduce((s, d) => s + (Number(d.cost) || 0), 0)
-            setPlans([{ days: normalized, start: normalized[0]?.place || '', end: normalized[normalized.length-1]?.place || '', total }])
-            setSelectedPlanIdx(0)
-            setCards(normalized)
-            setTotalCost(total)
-          }
-        })
-        .catch(() => setCards([]))
-        .finally(() => setCardsLoading(false))
+      loadPlans(userId)
     }
     window.addEventListener('profile:updated', onProfileUpdated)
     return () => window.removeEventListener('profile:updated', onProfileUpdated)
@@ -342,7 +319,7 @@ function App() {
               <button className="plan-modal-close" aria-label="Close" onClick={()=>setIsPlanModalOpen(false)}>×</button>
             </div>
             <div className="plan-modal-body">
-              {cardsLoading ? <p>Loading…</p> : (cards && cards.length ? <PersonalizedCards items={cards} /> : <p>No itinerary found.</p>)}
+              {cards && cards.length ? <PersonalizedCards items={cards} /> : (cardsLoading ? <p>Loading…</p> : <p>No itinerary found.</p>)}
             </div>
           </div>
         </div>
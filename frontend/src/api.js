@@ -29,7 +29,17 @@ export function buildPlanRequestFromProfile(userId) {
   }
 }
 
-export async function planTrip(payload) {
+// The server keeps the options and chat history under this id, so /ask only sends the question.
+function loadSession(userId) {
+  try { return localStorage.getItem(profileKey(userId, 'session_id')) || null } catch { return null }
+}
+
+function saveSession(userId, sessionId) {
+  if (!sessionId) return
+  try { localStorage.setItem(profileKey(userId, 'session_id'), sessionId) } catch {}
+}
+
+export async function planTrip(payload, userId) {
   if (!API_BASE_URL) return null
   const url = new URL('/plan', API_BASE_URL)
   const res = await fetch(url.toString(), {
@@ -38,7 +48,9 @@ export async function planTrip(payload) {
     body: JSON.stringify(payload),
   })
   if (!res.ok) throw new Error(`API error ${res.status}`)
-  return res.json()
+  const data = await res.json()
+  saveSession(userId, data?.session_id)
+  return data
 }
 
 export async function askQuestion(question, userId) {
@@ -54,10 +66,83 @@ export async function askQuestion(question, userId) {
   const res = await fetch(url.toString(), {
     method: 'POST',
     headers: { 'Accept': 'application/json', 'Content-Type': 'application/json' },
-    body: JSON.stringify({ question, preferences, start_city }),
+    body: JSON.stringify({ question, preferences, start_city, session_id: loadSession(userId) }),
   })
   if (!res.ok) throw new Error(`API error ${res.status}`)
-  return res.json()
+  const data = await res.json()
+  saveSession(userId, data?.session_id)
+  return data
+}
+
+async function readNdjson(res, onEvent) {
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  for (;;) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const lines = buffer.split('\n')
+    buffer = lines.pop()
+    for (const line of lines) {
+      if (line.trim()) onEvent(JSON.parse(line))
+    }
+  }
+  if (buffer.trim()) onEvent(JSON.parse(buffer))
+}
+
+// Streams /plan events: start, day (partial itinerary line), option, failed/timeout, done.
+// Resolves with the same shape as planTrip once the stream ends.
+export async function planTripStream(payload, userId, onEvent) {
+  if (!API_BASE_URL) return null
+  const url = new URL('/plan/stream', API_BASE_URL)
+  const res = await fetch(url.toString(), {
+    method: 'POST',
+    headers: { 'Accept': 'application/x-ndjson', 'Content-Type': 'application/json' },
+    body: JSON.stringify(payload),
+  })
+  if (!res.ok) throw new Error(`API error ${res.status}`)
+  const options = []
+  let session_id = null
+  await readNdjson(res, (event) => {
+    if (event.type === 'option') options.push(event.option)
+    if (event.type === 'done') session_id = event.session_id || null
+    if (onEvent) onEvent(event)
+  })
+  saveSession(userId, session_id)
+  options.sort((a, b) => (a.total_cost || 0) - (b.total_cost || 0))
+  return { options, count: options.length, budget_limit: payload?.budget, session_id }
+}
+
+// Streams /ask tokens to onToken(text, answerSoFar); resolves with the final answer payload.
+export async function askQuestionStream(question, userId, onToken) {
+  if (!API_BASE_URL) return { answer: '' }
+  const k = (n) => profileKey(userId, n)
+  let preferences = []
+  let start_city = 'Delhi'
+  try {
+    preferences = normalizePreferences(JSON.parse(localStorage.getItem(k('interests')) || '[]'))
+    start_city = localStorage.getItem(k('start_city')) || 'Delhi'
+  } catch {}
+  const url = new URL('/ask/stream', API_BASE_URL)
+  const res = await fetch(url.toString(), {
+    method: 'POST',
+    headers: { 'Accept': 'application/x-ndjson', 'Content-Type': 'application/json' },
+    body: JSON.stringify({ question, preferences, start_city, session_id: loadSession(userId) }),
+  })
+  if (!res.ok) throw new Error(`API error ${res.status}`)
+  let answer = ''
+  let result = { answer: '' }
+  await readNdjson(res, (event) => {
+    if (event.type === 'token') {
+      answer += event.text
+      if (onToken) onToken(event.text, answer)
+    } else if (event.type === 'done') {
+      result = event
+    }
+  })
+  saveSession(userId, result?.session_id)
+  return result
 }
 
 // trips APIs removed